@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, Query, Path
 
 from app.controllers.conversation_controller import ConversationController
+from app.models.cassandra_models import inbox_cache, inbox_queue
+from app.models.pagination import MAX_PAGE_NUMBER, MAX_PAGE_SIZE
 from app.schemas.conversation import (
     ConversationResponse,
     PaginatedConversationResponse
@@ -11,8 +13,9 @@ router = APIRouter(prefix="/api/conversations", tags=["Conversations"])
 @router.get("/user/{user_id}", response_model=PaginatedConversationResponse)
 async def get_user_conversations(
     user_id: int = Path(..., description="ID of the user"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of conversations per page"),
+    page: int = Query(1, ge=1, le=MAX_PAGE_NUMBER, description="Page number"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Number of conversations per page"),
+    include_total: bool = Query(True, description="Include the total conversation count"),
     conversation_controller: ConversationController = Depends()
 ) -> PaginatedConversationResponse:
     """
@@ -21,9 +24,24 @@ async def get_user_conversations(
     return await conversation_controller.get_user_conversations(
         user_id=user_id,
         page=page,
-        limit=limit
+        limit=limit,
+        include_total=include_total
     )
 
+@router.get("/cache/stats")
+async def get_inbox_cache_stats() -> dict:
+    """
+    Get hit, miss and eviction counts of the inbox cache
+    """
+    return inbox_cache.stats()
+
+@router.get("/inbox-queue/stats")
+async def get_inbox_queue_stats() -> dict:
+    """
+    Get the depth of the inbox write-behind queue and how many updates it merged
+    """
+    return inbox_queue.stats()
+
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int = Path(..., description="ID of the conversation"),
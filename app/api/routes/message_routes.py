@@ -3,10 +3,16 @@ from typing import Optional
 from datetime import datetime
 
 from app.controllers.message_controller import MessageController
+from app.models.pagination import MAX_PAGE_SIZE
 from app.schemas.message import (
     MessageCreate, 
     MessageResponse, 
-    PaginatedMessageResponse
+    PaginatedMessageResponse,
+    MessageBatchCreate,
+    MessageBatchResponse,
+    MessageSyncResponse,
+    MessageSyncRequest,
+    MessageSyncBatchResponse
 )
 
 router = APIRouter(prefix="/api/messages", tags=["Messages"])
@@ -21,36 +27,80 @@ async def send_message(
     """
     return await message_controller.send_message(message)
 
+@router.post("/batch", response_model=MessageBatchResponse)
+async def send_messages(
+    batch: MessageBatchCreate = Body(...),
+    message_controller: MessageController = Depends()
+) -> MessageBatchResponse:
+    """
+    Send many messages in one request, with a result for each message
+    """
+    return await message_controller.send_messages(batch)
+
+@router.post("/sync", response_model=MessageSyncBatchResponse)
+async def sync_messages(
+    request: MessageSyncRequest = Body(...),
+    message_controller: MessageController = Depends()
+) -> MessageSyncBatchResponse:
+    """
+    Get the messages missed in several conversations since their last known positions
+    """
+    return await message_controller.sync_messages(request)
+
 @router.get("/conversation/{conversation_id}", response_model=PaginatedMessageResponse)
 async def get_conversation_messages(
     conversation_id: int = Path(..., description="ID of the conversation"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of messages per page"),
+    page: int = Query(1, description="Page number", deprecated=True),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Number of messages per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    include_total: bool = Query(True, description="Include the total message count"),
     message_controller: MessageController = Depends()
 ) -> PaginatedMessageResponse:
     """
-    Get all messages in a conversation with pagination
+    Get all messages in a conversation, newest first, with cursor pagination
     """
     return await message_controller.get_conversation_messages(
         conversation_id=conversation_id,
         page=page,
-        limit=limit
+        limit=limit,
+        cursor=cursor,
+        include_total=include_total
     )
 
 @router.get("/conversation/{conversation_id}/before", response_model=PaginatedMessageResponse)
 async def get_messages_before_timestamp(
     conversation_id: int = Path(..., description="ID of the conversation"),
     before_timestamp: datetime = Query(..., description="Get messages before this timestamp"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of messages per page"),
+    page: int = Query(1, description="Page number", deprecated=True),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Number of messages per page"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
     message_controller: MessageController = Depends()
 ) -> PaginatedMessageResponse:
     """
-    Get messages in a conversation before a specific timestamp with pagination
+    Get messages in a conversation before a specific timestamp with cursor pagination
     """
     return await message_controller.get_messages_before_timestamp(
         conversation_id=conversation_id,
         before_timestamp=before_timestamp,
         page=page,
+        limit=limit,
+        cursor=cursor
+    )
+
+@router.get("/conversation/{conversation_id}/after", response_model=MessageSyncResponse)
+async def get_messages_after(
+    conversation_id: int = Path(..., description="ID of the conversation"),
+    after_timestamp: Optional[datetime] = Query(None, description="Get messages after this timestamp"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous sync, takes precedence over after_timestamp"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of messages to return"),
+    message_controller: MessageController = Depends()
+) -> MessageSyncResponse:
+    """
+    Get messages in a conversation newer than a timestamp or cursor, oldest first
+    """
+    return await message_controller.get_messages_after(
+        conversation_id=conversation_id,
+        after_timestamp=after_timestamp,
+        cursor=cursor,
         limit=limit
-    ) 
\ No newline at end of file
+    )
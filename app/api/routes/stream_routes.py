@@ -0,0 +1,66 @@
+import os
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Path, status
+from fastapi.responses import StreamingResponse
+
+from app.models.cassandra_models import PUSH_ENABLED, message_hub
+
+router = APIRouter(prefix="/api/stream", tags=["Stream"])
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = float(os.getenv("PUSH_HEARTBEAT_INTERVAL", "15"))
+
+def sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+async def user_events(user_id: int):
+    """Stream a user's events until the client disconnects or falls too far behind."""
+    subscription = message_hub.subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await subscription.get(timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                # Closed as a slow consumer or on shutdown
+                yield sse("resync", {"dropped": subscription.dropped})
+                return
+            if subscription.lagged:
+                subscription.lagged = False
+                yield sse("resync", {"dropped": subscription.dropped})
+            yield sse("message", event)
+    finally:
+        message_hub.unsubscribe(subscription)
+
+@router.get("/user/{user_id}")
+async def stream_user_messages(
+    user_id: int = Path(..., description="ID of the user")
+) -> StreamingResponse:
+    """
+    Stream new messages sent or received by a user as Server-Sent Events.
+    
+    A resync event means messages were missed; fetch them over the REST endpoints.
+    With push turned off the request fails with 503, and clients should poll.
+    """
+    if not PUSH_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Push delivery is disabled on this server; poll the REST endpoints instead"
+        )
+    return StreamingResponse(
+        user_events(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/stats")
+async def get_stream_stats() -> dict:
+    """
+    Get open subscriptions and published, delivered and dropped event counts
+    """
+    return message_hub.stats()
@@ -0,0 +1,3 @@
+from app.cache.lru import LRUCache
+from app.cache.inbox import InboxCache
+from app.cache.tail import TailBuffer
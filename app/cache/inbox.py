@@ -0,0 +1,117 @@
+"""
+Cache of inbox pages served by ConversationModel.get_user_conversations.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+from app.cache.invalidation import InvalidationLog
+
+# Rough per-row overhead of a cached conversation dict, on top of its text
+_ROW_OVERHEAD = 400
+_PAGE_OVERHEAD = 300
+
+
+def _estimate_size(page: Dict[str, Any]) -> int:
+    """Approximate the memory held by a cached inbox page."""
+    size = _PAGE_OVERHEAD
+    for row in page.get('data', ()):
+        size += _ROW_OVERHEAD + len(row.get('last_message_content') or '')
+    return size
+
+
+class InboxCache:
+    """
+    LRU cache of inbox pages with a memory bound and a TTL.
+    
+    Entries are keyed by (user_id, *page parameters) and indexed per user so a
+    send can drop every cached page of both participants. Readers take a
+    ticket before querying; a page is only stored if its user's inbox has not
+    been invalidated since, so a read racing a send cannot cache stale data.
+    
+    Instances are meant to be used from the event loop thread only.
+    """
+    
+    def __init__(self, max_bytes: int, ttl: float, max_tracked_users: int = 100000):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._keys_by_user: Dict[Hashable, Set[Tuple]] = {}
+        self._invalidations = InvalidationLog(max_tracked_users)
+    
+    def ticket(self) -> int:
+        """Take a ticket to pass to put() for a page about to be read."""
+        return self._invalidations.ticket()
+    
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Return a cached page, or None if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, _, page = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return page
+    
+    def put(self, key: Tuple, page: Dict[str, Any], ticket: int) -> None:
+        """
+        Store a page of key[0]'s inbox read under ticket.
+        
+        The page is dropped if the inbox was invalidated after the ticket was
+        taken. Least recently used pages are evicted until the cache fits
+        max_bytes.
+        """
+        user_id = key[0]
+        if self._invalidations.invalidated_since(user_id, ticket):
+            return
+        size = _estimate_size(page)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, page)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def invalidate(self, user_id: Hashable) -> None:
+        """Drop every cached page of a user's inbox."""
+        self._invalidations.invalidate(user_id)
+        for key in self._keys_by_user.pop(user_id, ()):
+            _, size, _ = self._entries.pop(key)
+            self.size -= size
+        self.invalidations += 1
+    
+    def _remove(self, key: Tuple) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counts along with the current footprint."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+        }
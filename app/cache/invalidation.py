@@ -0,0 +1,42 @@
+"""
+Bookkeeping that keeps caches filled by slow reads from going stale.
+"""
+from collections import OrderedDict
+from typing import Hashable
+
+
+class InvalidationLog:
+    """
+    Remembers when each key was last invalidated, with bounded memory.
+    
+    A reader takes a ticket before querying and, once the query returns,
+    asks whether the key was invalidated since; if so the result may predate
+    a write and must not be cached. Only the latest max_keys invalidations are
+    kept; for a forgotten key the answer is conservatively "maybe".
+    """
+    
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._seq = 0
+        self._last: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._forgotten_seq = 0
+    
+    def ticket(self) -> int:
+        """Take a ticket before starting a read."""
+        return self._seq
+    
+    def invalidate(self, key: Hashable) -> None:
+        """Record that key changed."""
+        self._seq += 1
+        self._last[key] = self._seq
+        self._last.move_to_end(key)
+        while len(self._last) > self.max_keys:
+            _, seq = self._last.popitem(last=False)
+            self._forgotten_seq = max(self._forgotten_seq, seq)
+    
+    def invalidated_since(self, key: Hashable, ticket: int) -> bool:
+        """Whether key may have changed after ticket was taken."""
+        last = self._last.get(key)
+        if last is None:
+            return self._forgotten_seq > ticket
+        return last > ticket
@@ -0,0 +1,47 @@
+"""
+Bounded in-process caches used in front of Cassandra lookups.
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    A size-bounded mapping that evicts the least recently used entry.
+    
+    Instances are meant to be used from the event loop thread only, so no
+    locking is done.
+    """
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+    
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value for key, marking it as recently used."""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Remove key from the cache and return its value."""
+        return self._entries.pop(key, default)
+    
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        self._entries.clear()
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+    
+    def __len__(self) -> int:
+        return len(self._entries)
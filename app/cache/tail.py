@@ -0,0 +1,126 @@
+"""
+In-memory tail of the newest messages of recently active conversations.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from app.cache.invalidation import InvalidationLog
+
+Row = Dict[str, Any]
+
+
+class _Tail:
+    __slots__ = ('rows', 'complete', 'expires_at')
+    
+    def __init__(self, rows: List[Row], complete: bool, expires_at: float):
+        # Newest first, in the messages table's clustering order
+        self.rows = rows
+        # True when rows hold the whole conversation
+        self.complete = complete
+        # Monotonic time after which the tail is read from the database again
+        self.expires_at = expires_at
+
+
+def _newer(row: Row, other: Row) -> bool:
+    """Whether row sorts before other in (created_at DESC, message_id ASC) order."""
+    if row['created_at'] != other['created_at']:
+        return row['created_at'] > other['created_at']
+    return row['message_id'] < other['message_id']
+
+
+class TailBuffer:
+    """
+    Ring buffer of the last `capacity` messages for up to `max_conversations`
+    conversations, evicted least recently used first.
+    
+    A tail is loaded lazily from the database on a miss and then kept current
+    by the write path. Writes to conversations that are not loaded are
+    recorded in an InvalidationLog, so a load racing a write is discarded
+    rather than installed without it. Writes made through other processes
+    are not seen, so a tail is only served for `ttl` seconds after it was
+    loaded, then read again.
+    
+    Instances are meant to be used from the event loop thread only.
+    """
+    
+    def __init__(self, capacity: int, max_conversations: int, ttl: float):
+        self.capacity = capacity
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tails: "OrderedDict[Hashable, _Tail]" = OrderedDict()
+        self._invalidations = InvalidationLog(max_conversations * 4)
+    
+    def read(self, conversation_id: Hashable, count: int) -> Optional[List[Row]]:
+        """
+        Return the newest `count` messages of a conversation, newest first.
+        
+        Returns None when the buffer cannot answer exactly: the conversation
+        is not loaded or its tail has expired, or it holds fewer than `count`
+        rows of a longer one.
+        """
+        tail = self._tails.get(conversation_id)
+        if tail is not None and tail.expires_at < time.monotonic():
+            del self._tails[conversation_id]
+            tail = None
+        if tail is None or (len(tail.rows) < count and not tail.complete):
+            self.misses += 1
+            return None
+        self._tails.move_to_end(conversation_id)
+        self.hits += 1
+        return tail.rows[:count]
+    
+    def ticket(self) -> int:
+        """Take a ticket to pass to load() before reading from the database."""
+        return self._invalidations.ticket()
+    
+    def load(self, conversation_id: Hashable, rows: List[Row], ticket: int) -> None:
+        """
+        Install the newest rows of a conversation read under ticket.
+        
+        rows must be the result of reading `capacity` rows newest first. The
+        load is skipped if the conversation was written since the ticket.
+        """
+        if conversation_id in self._tails:
+            return
+        if self._invalidations.invalidated_since(conversation_id, ticket):
+            return
+        self._tails[conversation_id] = _Tail(list(rows[:self.capacity]), len(rows) < self.capacity,
+                                             time.monotonic() + self.ttl)
+        while len(self._tails) > self.max_conversations:
+            self._tails.popitem(last=False)
+            self.evictions += 1
+    
+    def append(self, conversation_id: Hashable, row: Row) -> None:
+        """Add a newly written message to a conversation's tail if it is loaded."""
+        self._invalidations.invalidate(conversation_id)
+        tail = self._tails.get(conversation_id)
+        if tail is None:
+            return
+        rows = tail.rows
+        position = 0
+        while position < len(rows) and not _newer(row, rows[position]):
+            position += 1
+        rows.insert(position, row)
+        if len(rows) > self.capacity:
+            rows.pop()
+            tail.complete = False
+        self._tails.move_to_end(conversation_id)
+    
+    def discard(self, conversation_id: Hashable) -> None:
+        """Forget a conversation's tail, e.g. after a write of unknown outcome."""
+        self._invalidations.invalidate(conversation_id)
+        self._tails.pop(conversation_id, None)
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counts along with the number of tails held."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'conversations': len(self._tails),
+            'capacity': self.capacity,
+        }
@@ -1,7 +1,11 @@
+from typing import Union
 from fastapi import HTTPException, status
+from fastapi.responses import Response
 
+from app.db.backend import StorageUnavailableError
 from app.schemas.conversation import ConversationResponse, PaginatedConversationResponse
 from app.models.cassandra_models import ConversationModel
+from app.api.responses import render
 
 class ConversationController:
     """
@@ -13,8 +17,9 @@ class ConversationController:
         self, 
         user_id: int, 
         page: int = 1, 
-        limit: int = 20
-    ) -> PaginatedConversationResponse:
+        limit: int = 20,
+        include_total: bool = True
+    ) -> Union[PaginatedConversationResponse, Response]:
         """
         Get all conversations for a user with pagination
         
@@ -22,6 +27,7 @@ class ConversationController:
             user_id: ID of the user
             page: Page number
             limit: Number of conversations per page
+            include_total: Whether to read the total conversation count
             
         Returns:
             Paginated list of conversations
@@ -33,23 +39,27 @@ class ConversationController:
             result = await ConversationModel.get_user_conversations(
                 user_id=user_id,
                 page=page,
-                limit=limit
-            )
-            conversations = []
-            for conv_data in result['data']:
-                conversations.append(ConversationResponse(
-                    id=conv_data['id'],
-                    user1_id=conv_data['user1_id'],
-                    user2_id=conv_data['user2_id'],
-                    last_message_at=conv_data['last_message_at'],
-                    last_message_content=conv_data['last_message_content']
-                ))
-            return PaginatedConversationResponse(
-                total=result['total'],
-                page=result['page'],
-                limit=result['limit'],
-                data=conversations
+                limit=limit,
+                include_total=include_total
             )
+            return render({
+                'total': result['total'],
+                'page': result['page'],
+                'limit': result['limit'],
+                'data': [
+                    {
+                        'id': conv_data['id'],
+                        'user1_id': conv_data['user1_id'],
+                        'user2_id': conv_data['user2_id'],
+                        'last_message_at': conv_data['last_message_at'],
+                        'last_message_content': conv_data['last_message_content']
+                    }
+                    for conv_data in result['data']
+                ]
+            }, PaginatedConversationResponse)
+        except StorageUnavailableError:
+            # Answered with 503 by the app's exception handler
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -85,6 +95,8 @@ class ConversationController:
             )
         except HTTPException:
             raise
+        except StorageUnavailableError:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
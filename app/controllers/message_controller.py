@@ -1,9 +1,27 @@
-from typing import Optional
+import logging
+from typing import Any, Dict, Optional, Union
 from datetime import datetime
 from fastapi import HTTPException, status
+from fastapi.responses import Response
 
-from app.schemas.message import MessageCreate, MessageResponse, PaginatedMessageResponse
-from app.models.cassandra_models import MessageModel
+from app.db.backend import StorageUnavailableError
+from app.schemas.message import (
+    MessageCreate,
+    MessageResponse,
+    PaginatedMessageResponse,
+    MessageBatchCreate,
+    MessageBatchResult,
+    MessageBatchResponse,
+    MessageSyncResponse,
+    MessageSyncRequest,
+    MessageSyncBatchResponse
+)
+from app.models.cassandra_models import MessageModel, PartialWriteError
+from app.models.keys import uuid_to_int
+from app.models.pagination import InvalidCursorError
+from app.api.responses import render
+
+logger = logging.getLogger(__name__)
 
 class MessageController:
     """
@@ -25,12 +43,17 @@ class MessageController:
             HTTPException: If message sending fails
         """
         try:
-            result = await MessageModel.create_message(
-                content=message_data.content,
-                sender_id=message_data.sender_id,
-                receiver_id=message_data.receiver_id
-            )
-            uuid_to_int = lambda uuid_obj: int(str(uuid_obj).replace('-', '')[:10], 16)
+            try:
+                result = await MessageModel.create_message(
+                    content=message_data.content,
+                    sender_id=message_data.sender_id,
+                    receiver_id=message_data.receiver_id
+                )
+            except PartialWriteError as e:
+                # The message is stored; a retry by the client would duplicate it,
+                # so report success and leave the stale inbox rows to the next send.
+                logger.error(str(e))
+                result = e.result
             return MessageResponse(
                 id=uuid_to_int(result['id']),
                 sender_id=result['sender_id'],
@@ -39,25 +62,88 @@ class MessageController:
                 created_at=result['created_at'],
                 conversation_id=uuid_to_int(result['conversation_id'])
             )
+        except StorageUnavailableError:
+            # Answered with 503 by the app's exception handler
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to send message: {str(e)}"
             )
     
+    async def send_messages(self, batch: MessageBatchCreate) -> MessageBatchResponse:
+        """
+        Send many messages in one request
+        
+        Args:
+            batch: The messages to send
+            
+        Returns:
+            Per-message results; one message failing does not fail the others
+        
+        Raises:
+            HTTPException: If the batch could not be processed at all
+        """
+        try:
+            outcomes = await MessageModel.create_messages([
+                {
+                    'content': message.content,
+                    'sender_id': message.sender_id,
+                    'receiver_id': message.receiver_id
+                }
+                for message in batch.messages
+            ])
+            results = []
+            for index, outcome in enumerate(outcomes):
+                if isinstance(outcome, StorageUnavailableError):
+                    # Nothing was sent to storage, so the whole batch can be retried
+                    raise outcome
+                if isinstance(outcome, PartialWriteError):
+                    # Stored, see send_message
+                    logger.error(str(outcome))
+                    outcome = outcome.result
+                if isinstance(outcome, BaseException):
+                    results.append(MessageBatchResult(index=index, error=str(outcome)))
+                    continue
+                results.append(MessageBatchResult(index=index, message=MessageResponse(
+                    id=uuid_to_int(outcome['id']),
+                    sender_id=outcome['sender_id'],
+                    receiver_id=outcome['receiver_id'],
+                    content=outcome['content'],
+                    created_at=outcome['created_at'],
+                    conversation_id=uuid_to_int(outcome['conversation_id'])
+                )))
+            failed = sum(1 for result in results if result.error is not None)
+            return MessageBatchResponse(
+                succeeded=len(results) - failed,
+                failed=failed,
+                results=results
+            )
+        except StorageUnavailableError:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to send messages: {str(e)}"
+            )
+    
     async def get_conversation_messages(
         self, 
         conversation_id: int, 
         page: int = 1, 
-        limit: int = 20
-    ) -> PaginatedMessageResponse:
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Union[PaginatedMessageResponse, Response]:
         """
         Get all messages in a conversation with pagination
         
         Args:
             conversation_id: ID of the conversation
-            page: Page number
+            page: Page number (kept for compatibility, use cursor instead)
             limit: Number of messages per page
+            cursor: Cursor returned by the previous page
+            include_total: Whether to read the total message count
             
         Returns:
             Paginated list of messages
@@ -69,25 +155,24 @@ class MessageController:
             result = await MessageModel.get_conversation_messages(
                 conversation_id=conversation_id,
                 page=page,
-                limit=limit
+                limit=limit,
+                cursor=cursor,
+                include_total=include_total
             )
-            messages = []
-            for msg_data in result['data']:
-                uuid_to_int = lambda uuid_obj: int(str(uuid_obj).replace('-', '')[:10], 16)
-                messages.append(MessageResponse(
-                    id=uuid_to_int(msg_data['id']),
-                    sender_id=msg_data['sender_id'],
-                    receiver_id=msg_data['receiver_id'],
-                    content=msg_data['content'],
-                    created_at=msg_data['created_at'],
-                    conversation_id=uuid_to_int(msg_data['conversation_id'])
-                ))
-            return PaginatedMessageResponse(
-                total=result['total'],
-                page=result['page'],
-                limit=result['limit'],
-                data=messages
+            return render({
+                'total': result['total'],
+                'page': result['page'],
+                'limit': result['limit'],
+                'next_cursor': result['next_cursor'],
+                'data': result['data']
+            }, PaginatedMessageResponse)
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
             )
+        except StorageUnavailableError:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -99,16 +184,18 @@ class MessageController:
         conversation_id: int, 
         before_timestamp: datetime,
         page: int = 1, 
-        limit: int = 20
-    ) -> PaginatedMessageResponse:
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Union[PaginatedMessageResponse, Response]:
         """
         Get messages in a conversation before a specific timestamp with pagination
         
         Args:
             conversation_id: ID of the conversation
             before_timestamp: Get messages before this timestamp
-            page: Page number
+            page: Page number (kept for compatibility, use cursor instead)
             limit: Number of messages per page
+            cursor: Cursor returned by the previous page
             
         Returns:
             Paginated list of messages
@@ -121,27 +208,113 @@ class MessageController:
                 conversation_id=conversation_id,
                 before_timestamp=before_timestamp,
                 page=page,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
-            messages = []
-            for msg_data in result['data']:
-                uuid_to_int = lambda uuid_obj: int(str(uuid_obj).replace('-', '')[:10], 16)
-                messages.append(MessageResponse(
-                    id=uuid_to_int(msg_data['id']),
-                    sender_id=msg_data['sender_id'],
-                    receiver_id=msg_data['receiver_id'],
-                    content=msg_data['content'],
-                    created_at=msg_data['created_at'],
-                    conversation_id=uuid_to_int(msg_data['conversation_id'])
-                ))
-            return PaginatedMessageResponse(
-                total=result['total'],
-                page=result['page'],
-                limit=result['limit'],
-                data=messages
+            return render({
+                'total': result['total'],
+                'page': result['page'],
+                'limit': result['limit'],
+                'next_cursor': result['next_cursor'],
+                'data': result['data']
+            }, PaginatedMessageResponse)
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
             )
+        except StorageUnavailableError:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to get messages before timestamp: {str(e)}"
-            ) 
\ No newline at end of file
+            )
+    
+    @staticmethod
+    def _sync_payload(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert one conversation's sync result into MessageSyncResponse's fields."""
+        return {
+            'conversation_id': result['conversation_id'],
+            'limit': result['limit'],
+            'has_more': result['has_more'],
+            'next_cursor': result['next_cursor'],
+            'data': result['data']
+        }
+    
+    async def get_messages_after(
+        self,
+        conversation_id: int,
+        after_timestamp: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Union[MessageSyncResponse, Response]:
+        """
+        Get messages in a conversation newer than a timestamp or cursor, oldest first
+        
+        Args:
+            conversation_id: ID of the conversation
+            after_timestamp: Get messages after this timestamp
+            cursor: next_cursor of the previous sync, takes precedence over after_timestamp
+            limit: Maximum number of messages to return
+        
+        Returns:
+            The missing messages and the position to resume from
+        
+        Raises:
+            HTTPException: If the cursor is invalid or the read fails
+        """
+        try:
+            result = await MessageModel.get_messages_after(
+                conversation_id=conversation_id,
+                after_timestamp=after_timestamp,
+                cursor=cursor,
+                limit=limit
+            )
+            return render(self._sync_payload(result), MessageSyncResponse)
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except StorageUnavailableError:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to get messages after position: {str(e)}"
+            )
+    
+    async def sync_messages(self, request: MessageSyncRequest) -> Union[MessageSyncBatchResponse, Response]:
+        """
+        Get the missing messages of several conversations in one request
+        
+        Args:
+            request: Each conversation's last known position and the per-conversation limit
+        
+        Returns:
+            Per-conversation results, in request order
+        
+        Raises:
+            HTTPException: If a cursor is invalid or the reads fail
+        """
+        try:
+            results = await MessageModel.sync_conversations(
+                [position.model_dump() for position in request.conversations],
+                limit=request.limit
+            )
+            return render({
+                'results': [self._sync_payload(result) for result in results]
+            }, MessageSyncBatchResponse)
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except StorageUnavailableError:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to sync messages: {str(e)}"
+            )
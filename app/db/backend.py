@@ -0,0 +1,95 @@
+"""
+Storage backend interface for the Messenger application.
+
+The models talk to storage through this interface only. Backends accept the
+CQL statements the models issue, so the same model code runs on Cassandra
+and on the in-memory engine. STORAGE_BACKEND selects one: "cassandra"
+(default) or "memory".
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+Params = Union[Tuple, Dict, None]
+
+# Execution profiles the models choose per query. Backends without such
+# settings ignore them; queries without a profile use the backend's default.
+# Latency-sensitive, idempotent reads such as history and inbox pages
+PROFILE_READ = "read"
+# Message, inbox and counter writes
+PROFILE_WRITE = "write"
+
+
+class StorageUnavailableError(Exception):
+    """Raised by queries issued before the backend has connected."""
+
+
+class StorageBackend(ABC):
+    """Query interface shared by all storage backends."""
+    
+    @abstractmethod
+    def execute(self, query: str, params: Params = None,
+                fetch_size: Optional[int] = None,
+                profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Execute a query, blocking until its rows are available."""
+    
+    @abstractmethod
+    async def aexecute(self, query: str, params: Params = None,
+                       fetch_size: Optional[int] = None,
+                       profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Execute a query without blocking the event loop."""
+    
+    @abstractmethod
+    async def aexecute_batch(self, statements: List[Tuple[str, Params]],
+                             profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Apply statements that share a partition key as one mutation."""
+    
+    @abstractmethod
+    def astream(self, query: str, params: Params = None,
+                fetch_size: Optional[int] = None,
+                profile: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a query's rows, fetching further pages only as they are consumed."""
+    
+    @abstractmethod
+    def get_session(self) -> Any:
+        """Make sure the backend is ready to serve queries and return its session."""
+    
+    @abstractmethod
+    def close(self) -> None:
+        """Release the backend's connections and resources."""
+
+    async def start(self, warm_queries: Sequence[str] = ()) -> None:
+        """
+        Connect and prepare warm_queries, retrying until it succeeds.
+        
+        Run as a background task so the server starts without waiting for
+        storage. Backends with nothing to connect are ready at once.
+        """
+    
+    def status(self) -> Dict[str, Any]:
+        """Whether the backend can serve queries yet, with details for /readyz."""
+        return {'ready': True}
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def get_backend() -> StorageBackend:
+    """
+    Return the process-wide storage backend, creating it on first use.
+    
+    Only the selected backend's module is imported, so the in-memory backend
+    never loads or connects the Cassandra client.
+    """
+    global _backend
+    if _backend is None:
+        name = os.getenv("STORAGE_BACKEND", "cassandra").lower()
+        if name == "memory":
+            from app.db.memory_backend import MemoryBackend
+            _backend = MemoryBackend()
+        elif name == "cassandra":
+            from app.db.cassandra_client import cassandra_client
+            _backend = cassandra_client
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND '{name}', expected 'cassandra' or 'memory'")
+    return _backend
@@ -2,21 +2,85 @@
 Cassandra client for the Messenger application.
 This provides a connection to the Cassandra database.
 """
+import asyncio
 import os
 import uuid
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import AsyncIterator, List, Dict, Any, Optional, Sequence, Tuple, Union
 from datetime import datetime
 import logging
+import random
+import threading
 import time
 
-from cassandra.cluster import Cluster, Session
+from cassandra import ConsistencyLevel
+from cassandra.cluster import Cluster, Session, ExecutionProfile, EXEC_PROFILE_DEFAULT
 from cassandra.auth import PlainTextAuthProvider
-from cassandra.query import SimpleStatement, dict_factory
+from cassandra.policies import ConstantSpeculativeExecutionPolicy, DCAwareRoundRobinPolicy, TokenAwarePolicy
+from cassandra.query import BatchStatement, BatchType, SimpleStatement, PreparedStatement
+
+from app.db.backend import PROFILE_READ, PROFILE_WRITE, StorageBackend, StorageUnavailableError
+from app.db.rows import row_factory
+from app.metrics import observe_query
 
 logger = logging.getLogger(__name__)
 
-class CassandraClient:
-    """Singleton Cassandra client for the application."""
+def consistency_level(name: str) -> int:
+    """Parse a consistency level name such as LOCAL_QUORUM."""
+    try:
+        return ConsistencyLevel.name_to_value[name.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown consistency level '{name}'")
+
+def execution_profiles() -> Dict[Any, ExecutionProfile]:
+    """
+    Build the execution profiles from the environment.
+    
+    Every profile routes token-aware within the local datacenter, so a
+    statement goes straight to a replica of its partition instead of through
+    a coordinator in another zone. The read profile also sends a speculative
+    copy of an idempotent read to the next replica when the first has not
+    answered after CASSANDRA_SPECULATIVE_DELAY_MS, cutting the tail latency
+    of slow replicas.
+    
+    Environment:
+        CASSANDRA_LOCAL_DC: Local datacenter, inferred from the contact points if unset
+        CASSANDRA_CONSISTENCY: Default profile consistency (LOCAL_QUORUM)
+        CASSANDRA_READ_CONSISTENCY: History, inbox and counter reads (LOCAL_ONE)
+        CASSANDRA_WRITE_CONSISTENCY: Message, inbox and counter writes (LOCAL_QUORUM)
+        CASSANDRA_SERIAL_CONSISTENCY: Paxos phase of IF NOT EXISTS inserts (LOCAL_SERIAL)
+        CASSANDRA_REQUEST_TIMEOUT: Seconds before a request fails (10)
+        CASSANDRA_SPECULATIVE_DELAY_MS: Delay before a speculative read (50)
+        CASSANDRA_SPECULATIVE_ATTEMPTS: Speculative reads per query, 0 to disable (1)
+    """
+    local_dc = os.getenv("CASSANDRA_LOCAL_DC") or None
+    timeout = float(os.getenv("CASSANDRA_REQUEST_TIMEOUT", "10"))
+    speculative_delay = float(os.getenv("CASSANDRA_SPECULATIVE_DELAY_MS", "50")) / 1000
+    speculative_attempts = int(os.getenv("CASSANDRA_SPECULATIVE_ATTEMPTS", "1"))
+    serial_consistency = consistency_level(os.getenv("CASSANDRA_SERIAL_CONSISTENCY", "LOCAL_SERIAL"))
+    
+    def profile(consistency: str, **options) -> ExecutionProfile:
+        # Policies hold per-profile state, so each profile gets its own
+        return ExecutionProfile(
+            load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc=local_dc)),
+            consistency_level=consistency_level(consistency),
+            serial_consistency_level=serial_consistency,
+            request_timeout=timeout,
+            row_factory=row_factory,
+            **options
+        )
+    
+    read_options = {}
+    if speculative_attempts > 0:
+        read_options["speculative_execution_policy"] = ConstantSpeculativeExecutionPolicy(
+            speculative_delay, speculative_attempts)
+    return {
+        EXEC_PROFILE_DEFAULT: profile(os.getenv("CASSANDRA_CONSISTENCY", "LOCAL_QUORUM")),
+        PROFILE_READ: profile(os.getenv("CASSANDRA_READ_CONSISTENCY", "LOCAL_ONE"), **read_options),
+        PROFILE_WRITE: profile(os.getenv("CASSANDRA_WRITE_CONSISTENCY", "LOCAL_QUORUM")),
+    }
+
+class CassandraClient(StorageBackend):
+    """Singleton Cassandra client for the application, the default storage backend."""
     
     _instance = None
     
@@ -32,118 +96,415 @@ class CassandraClient:
             return
         
         self.host = os.getenv("CASSANDRA_HOST", "localhost")
+        # A comma-separated list gives several contact points
+        self.contact_points = [host.strip() for host in self.host.split(",") if host.strip()]
         self.port = int(os.getenv("CASSANDRA_PORT", "9042"))
         self.keyspace = os.getenv("CASSANDRA_KEYSPACE", "messenger")
+        # Only used when the keyspace has to be created
+        self.replication_factor = int(os.getenv("CASSANDRA_REPLICATION_FACTOR", "3"))
+        self.fetch_size = int(os.getenv("CASSANDRA_FETCH_SIZE", "5000"))
+        self.max_in_flight = int(os.getenv("CASSANDRA_MAX_IN_FLIGHT", "256"))
+        # Backoff between connection attempts made by start(), in seconds
+        self.connect_backoff = float(os.getenv("CASSANDRA_CONNECT_BACKOFF", "0.5"))
+        self.connect_backoff_max = float(os.getenv("CASSANDRA_CONNECT_BACKOFF_MAX", "30"))
         
+        # Nothing connects at import: each server process opens its own
+        # connections in get_session(), e.g. from its startup hook after fork
         self.cluster = None
         self.session = None
+        self._prepared: Dict[str, PreparedStatement] = {}
+        self._prepare_lock = threading.Lock()
+        self._window: Optional[asyncio.Semaphore] = None
+        self._window_loop = None
+        # Progress of start(), reported by status()
+        self.connect_attempts = 0
+        self.last_error: Optional[str] = None
+        self.warmed = False
+        self.warm_failures = 0
         self._initialized = True
-        try:
-            self.connect()
-        except Exception as e:
-            logger.warning(f"Initial connection failed: {str(e)}")
-            try:
-                self.connect_without_keyspace()
-            except Exception as e:
-                logger.error(f"Failed to connect without keyspace: {str(e)}")
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget_connection)
+    
+    def _forget_connection(self) -> None:
+        """
+        Drop a connection inherited through fork without shutting it down.
+        
+        The driver's sockets and I/O threads belong to the parent process, so
+        a forked child must not use or close them; it connects again on first use.
+        """
+        self.cluster = None
+        self.session = None
+        self._prepared = {}
+        self._window = None
+        self._window_loop = None
+        self.warmed = False
+    
+    def _cluster(self) -> Cluster:
+        """Create the Cluster for the configured contact points, port and execution profiles."""
+        return Cluster(self.contact_points, port=self.port, execution_profiles=execution_profiles())
     
     def connect_without_keyspace(self) -> None:
         try:
-            self.cluster = Cluster([self.host])
+            self.cluster = self._cluster()
             self.session = self.cluster.connect()
-            self.session.row_factory = dict_factory
+            self._prepared = {}
             logger.info(f"Connected to Cassandra at {self.host}:{self.port} without keyspace")
             self.session.execute(f"""
             CREATE KEYSPACE IF NOT EXISTS {self.keyspace} 
-            WITH replication = {{'class': 'SimpleStrategy', 'replication_factor': 3}}
+            WITH replication = {{'class': 'SimpleStrategy', 'replication_factor': {self.replication_factor}}}
             """)
             self.session.set_keyspace(self.keyspace)
             logger.info(f"Using keyspace: {self.keyspace}")
         except Exception as e:
             logger.error(f"Failed to connect without keyspace: {str(e)}")
+            self.close()
             raise
     
     def connect(self) -> None:
-        """Connect to the Cassandra cluster."""
-        retry_count = 0
-        max_retries = 5
+        """
+        Connect to the Cassandra cluster, making a single attempt.
+        
+        Retrying is left to start(), which waits between attempts without
+        blocking the event loop.
+        """
+        try:
+            self.cluster = self._cluster()
+            self.session = self.cluster.connect(self.keyspace)
+            self._prepared = {}
+            logger.info(f"Connected to Cassandra at {self.host}:{self.port}, keyspace: {self.keyspace} (pid {os.getpid()})")
+        except Exception:
+            self.close()
+            raise
+    
+    async def start(self, warm_queries: Sequence[str] = ()) -> None:
+        """
+        Connect in the background, then prepare warm_queries.
+        
+        The driver's blocking connect runs in a worker thread, so the server
+        answers /healthz while Cassandra is unreachable. Failed attempts are
+        retried after a random wait of up to CASSANDRA_CONNECT_BACKOFF seconds,
+        doubling per attempt up to CASSANDRA_CONNECT_BACKOFF_MAX; the jitter
+        keeps restarted workers from reconnecting in lockstep. Runs until
+        connected or cancelled.
+        
+        Args:
+            warm_queries: Queries to prepare before reporting ready, so the
+                first requests do not pay for preparing them
+        """
+        backoff = self.connect_backoff
+        while not self.session:
+            self.connect_attempts += 1
+            try:
+                await asyncio.to_thread(self.get_session)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                wait_time = random.uniform(0, backoff)
+                logger.warning(f"Connection attempt {self.connect_attempts} failed: {str(e)}. Retrying in {wait_time:.1f} seconds...")
+                await asyncio.sleep(wait_time)
+                backoff = min(backoff * 2, self.connect_backoff_max)
         
-        while retry_count < max_retries:
+        self.warm_failures = 0
+        for query in warm_queries:
             try:
-                self.cluster = Cluster([self.host])
-                self.session = self.cluster.connect(self.keyspace)
-                self.session.row_factory = dict_factory
-                logger.info(f"Connected to Cassandra at {self.host}:{self.port}, keyspace: {self.keyspace}")
-                return
+                await asyncio.to_thread(self.prepare, query)
             except Exception as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    wait_time = 2 ** retry_count 
-                    logger.warning(f"Connection attempt {retry_count} failed: {str(e)}. Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    logger.error(f"Failed to connect to Cassandra after {max_retries} attempts: {str(e)}")
-                    raise
+                # The statement is prepared again on first use
+                self.warm_failures += 1
+                logger.warning(f"Failed to prepare '{query}': {str(e)}")
+        self.warmed = True
+        logger.info(f"Storage ready with {len(self._prepared)} prepared statements")
+    
+    def status(self) -> Dict[str, Any]:
+        """Connection and warm-up state, ready once both are done."""
+        connected = self.session is not None
+        return {
+            'ready': connected and self.warmed,
+            'connected': connected,
+            'warmed': self.warmed,
+            'prepared_statements': len(self._prepared),
+            'warm_failures': self.warm_failures,
+            'connect_attempts': self.connect_attempts,
+            'last_error': self.last_error,
+        }
     
     def close(self) -> None:
         """Close the Cassandra connection."""
         if self.cluster:
             self.cluster.shutdown()
-            logger.info("Cassandra connection closed")
+            if self.session:
+                logger.info(f"Cassandra connection closed (pid {os.getpid()})")
+        self.cluster = None
+        self.session = None
+        self._prepared = {}
+        self.warmed = False
+    
+    def prepare(self, query: str) -> PreparedStatement:
+        """
+        Prepare a CQL query, caching the prepared statement by its text.
+        
+        Each statement is prepared once per session; later calls with the same
+        query text reuse the cached statement so Cassandra does not parse it again.
+        SELECTs are marked idempotent, which allows speculative execution.
+        
+        Args:
+            query: The CQL query string, using ``?`` bind markers
+            
+        Returns:
+            The prepared statement
+        """
+        statement = self._prepared.get(query)
+        if statement is not None:
+            return statement
+        
+        session = self.get_session()
+        with self._prepare_lock:
+            statement = self._prepared.get(query)
+            if statement is None:
+                statement = session.prepare(query)
+                statement.is_idempotent = self._is_read(query)
+                self._prepared[query] = statement
+        return statement
+    
+    @staticmethod
+    def _is_read(query: str) -> bool:
+        """Whether a query is a SELECT, which is safe to send more than once."""
+        return query.lstrip()[:6].upper() == "SELECT"
     
-    def execute(self, query: str, params: Union[Tuple, Dict, None] = None) -> List[Dict[str, Any]]:
+    def _statement(self, query: str, params: Union[Tuple, Dict, None], fetch_size: Optional[int] = None):
+        """Build the statement to send: prepared when bound, simple otherwise."""
+        if params is None:
+            statement = SimpleStatement(query, is_idempotent=self._is_read(query))
+        else:
+            statement = self.prepare(query).bind(params)
+        statement.fetch_size = fetch_size or self.fetch_size
+        return statement
+    
+    def execute(self, query: str, params: Union[Tuple, Dict, None] = None,
+                fetch_size: Optional[int] = None,
+                profile: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Execute a CQL query.
         
+        Queries with parameters are prepared once and bound with typed values;
+        queries without parameters (e.g. DDL) are sent as simple statements.
+        
         Args:
             query: The CQL query string
             params: The parameters for the query
+            fetch_size: Rows per page, defaults to CASSANDRA_FETCH_SIZE
+            profile: Execution profile name, the default profile if None
             
         Returns:
-            List of rows as dictionaries
+            List of rows, readable by column name like dictionaries
         """
         if not self.session:
             self.connect()
         
+        started = time.perf_counter()
         try:
-            statement = SimpleStatement(query)
-            if params is None:
-                result = self.session.execute(statement)
-            else:
-                result = self.session.execute(statement, params)
-            return list(result)
+            result = self.session.execute(self._statement(query, params, fetch_size),
+                                          execution_profile=profile or EXEC_PROFILE_DEFAULT)
+            rows = list(result)
         except Exception as e:
+            observe_query(query, time.perf_counter() - started, error=e)
             logger.error(f"Query execution failed: {str(e)}")
             raise
+        observe_query(query, time.perf_counter() - started, len(rows))
+        return rows
     
-    def execute_async(self, query: str, params: Union[Tuple, Dict, None] = None):
+    def execute_async(self, query: str, params: Union[Tuple, Dict, None] = None,
+                      fetch_size: Optional[int] = None, profile: Optional[str] = None):
         """
         Execute a CQL query asynchronously.
         
         Args:
             query: The CQL query string
             params: The parameters for the query
+            fetch_size: Rows per page, defaults to CASSANDRA_FETCH_SIZE
+            profile: Execution profile name, the default profile if None
             
         Returns:
             Async result object
+        
+        Raises:
+            StorageUnavailableError: If the session is not connected yet
         """
         if not self.session:
-            self.connect()
+            # Fail fast rather than block the event loop connecting
+            raise StorageUnavailableError("Cassandra is not connected yet")
         
         try:
-            statement = SimpleStatement(query)
-            if params is None:
-                return self.session.execute_async(statement)
-            else:
-                return self.session.execute_async(statement, params)
+            return self.session.execute_async(self._statement(query, params, fetch_size),
+                                              execution_profile=profile or EXEC_PROFILE_DEFAULT)
         except Exception as e:
             logger.error(f"Async query execution failed: {str(e)}")
             raise
     
+    async def aexecute(self, query: str, params: Union[Tuple, Dict, None] = None,
+                       fetch_size: Optional[int] = None,
+                       profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Execute a CQL query without blocking the event loop.
+        
+        The driver's ResponseFuture callbacks run on its I/O thread; they are
+        bridged into an asyncio future so many queries can be in flight at once.
+        
+        Args:
+            query: The CQL query string
+            params: The parameters for the query
+            fetch_size: Rows per page, defaults to CASSANDRA_FETCH_SIZE
+            profile: Execution profile name, the default profile if None
+            
+        Returns:
+            List of rows, readable by column name like dictionaries
+        """
+        started = time.perf_counter()
+        async with self._in_flight_window():
+            try:
+                rows = await self._wrap_future(self.execute_async(query, params, fetch_size, profile))
+            except Exception as e:
+                observe_query(query, time.perf_counter() - started, error=e)
+                logger.error(f"Query execution failed: {str(e)}")
+                raise
+        observe_query(query, time.perf_counter() - started, len(rows))
+        return rows
+    
+    async def aexecute_batch(self, statements: List[Tuple[str, Union[Tuple, Dict]]],
+                             profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Execute several statements as one unlogged batch.
+        
+        Meant for statements that share a partition key: Cassandra applies
+        them as a single mutation on one replica set, in one round trip. A
+        single statement is sent on its own.
+        
+        Args:
+            statements: (query, params) pairs
+            profile: Execution profile name, the default profile if None
+            
+        Returns:
+            List of rows, readable by column name like dictionaries
+        """
+        if len(statements) == 1:
+            return await self.aexecute(*statements[0], profile=profile)
+        if not self.session:
+            # Fail fast rather than block the event loop connecting
+            raise StorageUnavailableError("Cassandra is not connected yet")
+        
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        for query, params in statements:
+            batch.add(self.prepare(query), params)
+        # Recorded once per distinct combination of statements
+        label = f"BEGIN UNLOGGED BATCH {'; '.join(dict.fromkeys(query for query, _ in statements))} APPLY BATCH"
+        started = time.perf_counter()
+        async with self._in_flight_window():
+            try:
+                rows = await self._wrap_future(self.session.execute_async(
+                    batch, execution_profile=profile or EXEC_PROFILE_DEFAULT))
+            except Exception as e:
+                observe_query(label, time.perf_counter() - started, error=e)
+                logger.error(f"Batch execution failed: {str(e)}")
+                raise
+        observe_query(label, time.perf_counter() - started, len(rows))
+        return rows
+    
+    def _in_flight_window(self) -> asyncio.Semaphore:
+        """Semaphore bounding the queries this process keeps in flight."""
+        loop = asyncio.get_running_loop()
+        if self._window_loop is not loop:
+            self._window = asyncio.Semaphore(self.max_in_flight)
+            self._window_loop = loop
+        return self._window
+    
+    async def astream(self, query: str, params: Union[Tuple, Dict, None] = None,
+                      fetch_size: Optional[int] = None,
+                      profile: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute a CQL query and asynchronously yield its rows page by page.
+        
+        The next page is only requested once the caller has consumed the
+        current one, so breaking out of the loop stops fetching.
+        
+        Args:
+            query: The CQL query string
+            params: The parameters for the query
+            fetch_size: Rows per page, defaults to CASSANDRA_FETCH_SIZE
+            profile: Execution profile name, the default profile if None
+            
+        Yields:
+            Rows as dictionaries
+        """
+        loop = asyncio.get_running_loop()
+        pages: asyncio.Queue = asyncio.Queue()
+        started = time.perf_counter()
+        rows = 0
+        error = None
+        try:
+            response_future = self.execute_async(query, params, fetch_size, profile)
+            # Callbacks stay registered across pages and fire once per page
+            response_future.add_callbacks(
+                lambda page: loop.call_soon_threadsafe(pages.put_nowait, (page, None)),
+                lambda exc: loop.call_soon_threadsafe(pages.put_nowait, (None, exc)),
+            )
+            while True:
+                page, exc = await pages.get()
+                if exc is not None:
+                    logger.error(f"Query execution failed: {str(exc)}")
+                    raise exc
+                for row in page:
+                    rows += 1
+                    yield row
+                if not response_future.has_more_pages:
+                    return
+                response_future.start_fetching_next_page()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Covers the time the caller spent between pages too
+            observe_query(query, time.perf_counter() - started, rows, error)
+    
+    @staticmethod
+    def _wrap_future(response_future) -> asyncio.Future:
+        """Bridge a driver ResponseFuture into an asyncio future of all rows."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        rows: List[Dict[str, Any]] = []
+        
+        def set_result(result):
+            if not future.done():
+                future.set_result(result)
+        
+        def set_exception(exc):
+            if not future.done():
+                future.set_exception(exc)
+        
+        def on_page(page):
+            rows.extend(page)
+            if response_future.has_more_pages:
+                response_future.start_fetching_next_page()
+            else:
+                loop.call_soon_threadsafe(set_result, rows)
+        
+        def on_error(exc):
+            loop.call_soon_threadsafe(set_exception, exc)
+        
+        response_future.add_callbacks(on_page, on_error)
+        return future
+    
     def get_session(self) -> Session:
-        """Get the Cassandra session."""
+        """
+        Get the Cassandra session, connecting this process if needed.
+        
+        Creates the keyspace when it does not exist yet.
+        """
         if not self.session:
-            self.connect()
+            try:
+                self.connect()
+            except Exception as e:
+                logger.warning(f"Initial connection failed: {str(e)}")
+                self.connect_without_keyspace()
         return self.session
 
 # Create a global instance
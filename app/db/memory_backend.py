@@ -0,0 +1,444 @@
+"""
+In-memory storage backend for the Messenger application.
+
+Runs the CQL the models issue against tables held in process: single-partition
+INSERT (optionally IF NOT EXISTS), counter UPDATE, DELETE, and SELECT with an
+equality on the partition key, restrictions on the clustering columns, an
+optional ORDER BY reversing the clustering order and a LIMIT. Each partition
+keeps its rows sorted by clustering key, so range and limit reads are binary
+searches followed by a slice, as on the real tables.
+
+Meant for single-node edge deployments, tests and benchmarks. Data lives only
+as long as the process.
+"""
+import asyncio
+import re
+import threading
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.db.backend import Params, StorageBackend
+
+# table -> (partition key columns, ((clustering column, descending), ...)),
+# as created by scripts/setup_db.py
+TABLES = {
+    "messages": (("conversation_id",), (("created_at", True), ("message_id", False))),
+    "messages_by_bucket": (("conversation_id", "bucket"), (("created_at", True), ("message_id", False))),
+    "conversation_buckets": (("conversation_id",), (("bucket", True),)),
+    "conversations": (("user_id",), (("last_message_at", True), ("conversation_id", False))),
+    "inbox_index": (("user_id",), (("conversation_id", False),)),
+    "conversation_participants": (("conversation_id",), (("user_id", False),)),
+    "conversation_ids": (("id",), ()),
+    "conversation_message_counts": (("conversation_id",), ()),
+    "user_conversation_counts": (("user_id",), ()),
+}
+
+INSERT_RE = re.compile(
+    r"INSERT INTO ([\w.]+) \(([^)]*)\) VALUES \(([^)]*)\)( IF NOT EXISTS)?$", re.I)
+UPDATE_RE = re.compile(
+    r"UPDATE ([\w.]+) SET (\w+) = \2 \+ (\?|\d+) WHERE (.+)$", re.I)
+DELETE_RE = re.compile(
+    r"DELETE FROM ([\w.]+) WHERE (.+)$", re.I)
+SELECT_RE = re.compile(
+    r"SELECT (.+?) FROM ([\w.]+) WHERE (.+?)(?: ORDER BY (.+?))?(?: LIMIT (\?|\d+))?$", re.I)
+CONDITION_RE = re.compile(r"(\w+) (=|<=|>=|<|>) (\?|\d+)$")
+
+EPOCH = datetime(1970, 1, 1)
+
+# Rows per astream page when the caller gives no fetch_size, as CASSANDRA_FETCH_SIZE
+FETCH_SIZE = 5000
+
+# Range operators as seen from the sorted keys of an ascending column
+FLIPPED = {"<": ">", ">": "<", "<=": ">=", ">=": "<="}
+
+
+class _Reversed:
+    """Sort wrapper that reverses the order of a clustering value."""
+    
+    __slots__ = ("value",)
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def __lt__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return other.value < self.value
+    
+    def __gt__(self, other):
+        if not isinstance(other, _Reversed):
+            return NotImplemented
+        return self.value < other.value
+    
+    def __eq__(self, other):
+        return isinstance(other, _Reversed) and self.value == other.value
+    
+    def __hash__(self):
+        return hash(self.value)
+
+
+class _Top:
+    """Sentinel that sorts after every clustering value."""
+    
+    def __lt__(self, other):
+        return False
+    
+    def __gt__(self, other):
+        return other is not self
+    
+    def __eq__(self, other):
+        return other is self
+    
+    def __hash__(self):
+        return 0
+
+
+TOP = _Top()
+
+
+class Partition:
+    """
+    Rows of one partition, kept sorted in reverse clustering order.
+    
+    Reads in clustering order walk the keys backwards. The rows written most
+    often come first in clustering order, e.g. the newest message of a
+    conversation or inbox entry of a user, so they are appended at the end of
+    the key list rather than inserted at its front, which would shift every
+    other key.
+    """
+    
+    __slots__ = ("keys", "rows")
+    
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.rows: Dict[tuple, Dict[str, Any]] = {}
+    
+    def upsert(self, key: tuple, values: Dict[str, Any]) -> None:
+        """Insert a row or update the columns of an existing one."""
+        row = self.rows.get(key)
+        if row is None:
+            self.rows[key] = dict(values)
+            insort(self.keys, key)
+        else:
+            row.update(values)
+    
+    def remove(self, key: tuple) -> None:
+        """Delete a row if present."""
+        if self.rows.pop(key, None) is not None:
+            del self.keys[bisect_left(self.keys, key)]
+    
+    def slice(self, prefix: tuple, lower: Optional[Tuple[str, Any]],
+              upper: Optional[Tuple[str, Any]]) -> Tuple[int, int]:
+        """Index range of keys starting with prefix, within optional bounds on the next column."""
+        if prefix:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_right(self.keys, prefix + (TOP,))
+        else:
+            start, end = 0, len(self.keys)
+        if lower is not None:
+            op, value = lower
+            bound = prefix + (value,) if op == ">=" else prefix + (value, TOP)
+            start = max(start, bisect_left(self.keys, bound))
+        if upper is not None:
+            op, value = upper
+            bound = prefix + (value,) if op == "<" else prefix + (value, TOP)
+            end = min(end, bisect_left(self.keys, bound))
+        return start, end
+
+
+def _sort_value(value, desc: bool):
+    """
+    Map a clustering value to one that sorts against the column's order.
+    
+    Timestamps and UUIDs become integers, negated for ascending columns, so
+    binary searches compare natively; other types fall back to a wrapper.
+    """
+    if isinstance(value, datetime):
+        delta = value - EPOCH
+        value = delta.days * 86400000 + delta.seconds * 1000 + delta.microseconds // 1000
+    elif isinstance(value, uuid.UUID):
+        value = value.int
+    if desc:
+        return value
+    if isinstance(value, int):
+        return -value
+    return _Reversed(value)
+
+
+def _normalize(value):
+    """Store values the way the Cassandra driver reads them back."""
+    if isinstance(value, datetime):
+        # Cassandra keeps milliseconds and returns naive UTC datetimes
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Storage backend keeping every table in process memory.
+    
+    Statements are parsed once and cached by their text, like prepared
+    statements. Parameters are positional, bound to ``?`` markers in order.
+    """
+    
+    def __init__(self):
+        self.tables: Dict[str, Dict[tuple, Partition]] = {name: {} for name in TABLES}
+        self._plans: Dict[str, tuple] = {}
+        # Queries run on the event loop; the lock covers synchronous callers on other threads
+        self._lock = threading.Lock()
+    
+    def prepare(self, query: str) -> tuple:
+        """Parse a query once, caching the plan by its text."""
+        plan = self._plans.get(query)
+        if plan is None:
+            plan = self._parse(" ".join(query.split()))
+            self._plans[query] = plan
+        return plan
+    
+    def _parse(self, query: str) -> tuple:
+        match = INSERT_RE.match(query)
+        if match:
+            table, columns, _, if_not_exists = match.groups()
+            return ("insert", self._table(table), [c.strip() for c in columns.split(",")], bool(if_not_exists))
+        match = UPDATE_RE.match(query)
+        if match:
+            table, column, amount, where = match.groups()
+            return ("update", self._table(table), column, amount, self._conditions(where))
+        match = DELETE_RE.match(query)
+        if match:
+            table, where = match.groups()
+            return ("delete", self._table(table), self._conditions(where))
+        match = SELECT_RE.match(query)
+        if match:
+            columns, table, where, order, limit = match.groups()
+            columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+            table = self._table(table)
+            return ("select", table, columns, self._conditions(where), self._reversed(table, order), limit)
+        if query.upper().startswith(("CREATE", "DROP", "USE", "ALTER")):
+            return ("ddl",)
+        raise ValueError(f"Unsupported query for the memory backend: {query}")
+    
+    @staticmethod
+    def _table(name: str) -> str:
+        # Statements may qualify tables with the keyspace
+        name = name.split(".")[-1]
+        if name not in TABLES:
+            raise ValueError(f"Unknown table for the memory backend: {name}")
+        return name
+    
+    @staticmethod
+    def _reversed(table: str, order: Optional[str]) -> bool:
+        """Whether an ORDER BY clause reads the partition against its clustering order."""
+        if not order:
+            return False
+        clustering = dict(TABLES[table][1])
+        column, _, direction = order.split(",")[0].strip().partition(" ")
+        if column not in clustering:
+            raise ValueError(f"Cannot order {table} by {column}")
+        return (direction.strip().upper() == "DESC") != clustering[column]
+    
+    @staticmethod
+    def _conditions(where: str) -> List[Tuple[str, str, str]]:
+        conditions = []
+        for part in re.split(r" AND ", where, flags=re.I):
+            match = CONDITION_RE.match(part.strip())
+            if not match:
+                raise ValueError(f"Unsupported condition for the memory backend: {part}")
+            conditions.append(match.groups())
+        return conditions
+    
+    def execute(self, query: str, params: Params = None,
+                fetch_size: Optional[int] = None,
+                profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Execute a query against the in-memory tables.
+        
+        Args:
+            query: The CQL query string
+            params: Positional parameters for the query
+            fetch_size: Ignored, all rows are already in memory
+            profile: Ignored, every read sees the latest write
+        
+        Returns:
+            List of rows as dictionaries
+        """
+        plan = self.prepare(query)
+        params = iter(params or ())
+        kind = plan[0]
+        with self._lock:
+            if kind == "select":
+                return self._select(plan, params)
+            if kind == "insert":
+                return self._insert(plan, params)
+            if kind == "update":
+                return self._update(plan, params)
+            if kind == "delete":
+                return self._delete(plan, params)
+        return []
+    
+    @staticmethod
+    def _bind(token: str, params) -> Any:
+        return next(params) if token == "?" else int(token)
+    
+    @staticmethod
+    def _split(table: str, values: Dict[str, Any]) -> Tuple[tuple, tuple]:
+        """Partition key and sortable clustering key of a row."""
+        partition_key, clustering = TABLES[table]
+        pk = tuple(values[column] for column in partition_key)
+        ck = tuple(_sort_value(values[column], desc) for column, desc in clustering)
+        return pk, ck
+    
+    def _insert(self, plan, params) -> List[Dict[str, Any]]:
+        _, table, columns, if_not_exists = plan
+        values = {column: _normalize(next(params)) for column in columns}
+        pk, ck = self._split(table, values)
+        partitions = self.tables[table]
+        partition = partitions.get(pk)
+        if if_not_exists and partition is not None and ck in partition.rows:
+            return [dict(partition.rows[ck], **{"[applied]": False})]
+        if partition is None:
+            partition = partitions[pk] = Partition()
+        partition.upsert(ck, values)
+        return [{"[applied]": True}] if if_not_exists else []
+    
+    def _update(self, plan, params) -> List[Dict[str, Any]]:
+        _, table, column, amount, conditions = plan
+        amount = self._bind(amount, params)
+        key = {name: _normalize(self._bind(token, params)) for name, _, token in conditions}
+        pk, ck = self._split(table, key)
+        partition = self.tables[table].setdefault(pk, Partition())
+        row = partition.rows.get(ck)
+        current = row.get(column, 0) if row else 0
+        partition.upsert(ck, dict(key, **{column: current + amount}))
+        return []
+    
+    def _delete(self, plan, params) -> List[Dict[str, Any]]:
+        _, table, conditions = plan
+        key = {name: _normalize(self._bind(token, params)) for name, _, token in conditions}
+        partition_key, clustering = TABLES[table]
+        partitions = self.tables[table]
+        pk = tuple(key[column] for column in partition_key)
+        if not any(column in key for column, _ in clustering):
+            partitions.pop(pk, None)
+            return []
+        partition = partitions.get(pk)
+        if partition is not None:
+            partition.remove(self._split(table, key)[1])
+            if not partition.rows:
+                del partitions[pk]
+        return []
+    
+    def _select(self, plan, params) -> List[Dict[str, Any]]:
+        partition, keys = self._select_keys(plan, params)
+        return self._rows(partition, keys, plan[2])
+    
+    def _select_keys(self, plan, params) -> Tuple[Optional[Partition], List[tuple]]:
+        """The partition a SELECT reads and the keys of its rows, in result order."""
+        _, table, columns, conditions, reverse, limit = plan
+        partition_key, clustering = TABLES[table]
+        bound = [(name, op, _normalize(self._bind(token, params))) for name, op, token in conditions]
+        limit = self._bind(limit, params) if limit else None
+        
+        equal = {name: value for name, op, value in bound if op == "="}
+        if any(column not in equal for column in partition_key):
+            raise ValueError(f"Queries on {table} must restrict the partition key")
+        partition = self.tables[table].get(tuple(equal[column] for column in partition_key))
+        if partition is None:
+            return None, []
+        
+        # Equalities on leading clustering columns form a prefix, the next
+        # column may carry a range, as Cassandra itself requires
+        prefix: tuple = ()
+        lower = upper = None
+        for column, desc in clustering:
+            if column in equal:
+                prefix += (_sort_value(equal[column], desc),)
+                continue
+            for name, op, value in bound:
+                if name != column or op == "=":
+                    continue
+                value = _sort_value(value, desc)
+                if not desc:
+                    op = FLIPPED[op]
+                if op in (">", ">="):
+                    lower = (op, value)
+                else:
+                    upper = (op, value)
+            break
+        
+        # Keys are stored in reverse clustering order, so reading in
+        # clustering order starts from the end of the slice
+        start, end = partition.slice(prefix, lower, upper)
+        if reverse:
+            if limit is not None:
+                end = min(end, start + limit)
+            keys = partition.keys[start:end]
+        else:
+            if limit is not None:
+                start = max(start, end - limit)
+            keys = partition.keys[start:end][::-1]
+        return partition, keys
+    
+    @staticmethod
+    def _rows(partition: Optional[Partition], keys: List[tuple],
+              columns: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Copies of the rows at keys, skipping rows deleted since the keys were read."""
+        if partition is None:
+            return []
+        rows = [partition.rows.get(key) for key in keys]
+        if columns is None:
+            return [dict(row) for row in rows if row is not None]
+        return [{column: row.get(column) for column in columns} for row in rows if row is not None]
+    
+    async def aexecute(self, query: str, params: Params = None,
+                       fetch_size: Optional[int] = None,
+                       profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Execute a query, yielding to the event loop once as a network call would."""
+        await asyncio.sleep(0)
+        return self.execute(query, params)
+    
+    async def aexecute_batch(self, statements: List[Tuple[str, Params]],
+                             profile: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Apply statements in order without yielding in between, so the batch is atomic."""
+        await asyncio.sleep(0)
+        for query, params in statements:
+            self.execute(query, params)
+        return []
+    
+    async def astream(self, query: str, params: Params = None,
+                      fetch_size: Optional[int] = None,
+                      profile: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield a query's rows, copying fetch_size of them at a time.
+        
+        The matching keys are found up front; each page of rows is only copied
+        once the caller has consumed the previous one, with a yield to the
+        event loop in between, so a caller that stops early copies no more.
+        """
+        plan = self.prepare(query)
+        if plan[0] != "select":
+            for row in await self.aexecute(query, params):
+                yield row
+            return
+        await asyncio.sleep(0)
+        with self._lock:
+            partition, keys = self._select_keys(plan, iter(params or ()))
+        page_size = fetch_size or FETCH_SIZE
+        for start in range(0, len(keys), page_size):
+            if start:
+                await asyncio.sleep(0)
+            with self._lock:
+                page = self._rows(partition, keys[start:start + page_size], plan[2])
+            for row in page:
+                yield row
+    
+    def get_session(self) -> "MemoryBackend":
+        """The backend is its own session; there is nothing to connect."""
+        return self
+    
+    def close(self) -> None:
+        """Nothing to release; tables stay until the process exits."""
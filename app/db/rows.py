@@ -0,0 +1,56 @@
+"""
+Compact result rows for the Cassandra driver.
+
+The driver's dict_factory builds a dict per row. Rows here are tuples whose
+class maps column names to positions, shared by every row of the same
+columns, so a row costs one tuple while models keep reading row['column'].
+"""
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+
+class Row(tuple):
+    """Tuple of column values that can also be read by column name."""
+    
+    __slots__ = ()
+    _index: Dict[str, int] = {}
+    
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+    
+    def keys(self) -> Iterator[str]:
+        return iter(self._index)
+    
+    def values(self) -> "Row":
+        return self
+    
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self._index, self)
+    
+    def __repr__(self) -> str:
+        return f"Row({', '.join(f'{name}={value!r}' for name, value in self.items())})"
+
+
+# Column names -> Row subclass reading them
+_row_classes: Dict[Tuple[str, ...], type] = {}
+
+
+def row_class(colnames: Sequence[str]) -> type:
+    """The Row subclass for a result's columns, created once per column list."""
+    key = tuple(colnames)
+    cls = _row_classes.get(key)
+    if cls is None:
+        cls = type("Row", (Row,), {"__slots__": (), "_index": {name: i for i, name in enumerate(key)}})
+        _row_classes[key] = cls
+    return cls
+
+
+def row_factory(colnames: Sequence[str], rows: List[Sequence[Any]]) -> List[Row]:
+    """Driver row factory building compact Rows instead of dicts."""
+    cls = row_class(colnames)
+    return [cls(row) for row in rows]
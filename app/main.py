@@ -1,13 +1,16 @@
+import asyncio
 import logging
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-import sys
+from fastapi.responses import JSONResponse, PlainTextResponse
 import os
 
-from app.api.routes import message_router, conversation_router
+from app.api.routes import message_router, conversation_router, stream_router
 from app.controllers.message_controller import MessageController
 from app.controllers.conversation_controller import ConversationController
-from app.db.cassandra_client import cassandra_client
+from app.db.backend import StorageUnavailableError, get_backend
+from app.metrics import MetricsMiddleware, registry
+from app.models.cassandra_models import hot_queries, inbox_queue, message_hub
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +33,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route latency and storage statements per request, served at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Seconds clients are asked to wait before retrying while storage is not ready
+STORAGE_RETRY_AFTER = os.getenv("STORAGE_RETRY_AFTER", "1")
+
+@app.exception_handler(StorageUnavailableError)
+async def storage_unavailable_handler(request, exc: StorageUnavailableError):
+    """Queries made before storage is ready fail with 503, as /readyz reports."""
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": STORAGE_RETRY_AFTER})
 
 # Dependency injection
 def get_message_controller():
@@ -43,29 +56,79 @@ def get_conversation_controller():
 # Include routers
 app.include_router(message_router)
 app.include_router(conversation_router)
+app.include_router(stream_router)
 
 @app.get("/")
 async def root():
     return {"message": "FB Messenger API is running with Cassandra backend"}
 
+@app.get("/healthz", tags=["Health"])
+async def healthz():
+    """Liveness: the process is up and its event loop is responsive."""
+    return {"status": "ok"}
+
+@app.get("/readyz", tags=["Health"])
+async def readyz():
+    """Readiness: 200 once storage is connected and warmed up, 503 before."""
+    status = get_backend().status()
+    if not status['ready']:
+        return JSONResponse(status, status_code=503, headers={"Retry-After": STORAGE_RETRY_AFTER})
+    return JSONResponse(status)
+
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """Metrics of this process in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup."""
     logger.info("Initializing application...")
-    try:
-        # Ensure Cassandra connection is established
-        cassandra_client.get_session()
-        logger.info("Cassandra connection established")
-    except Exception as e:
-        logger.error(f"Failed to connect to Cassandra: {str(e)}")
-        sys.exit(1)
+    # Connecting may take a while when storage is down; the server starts
+    # right away and /readyz reports when queries can be served
+    app.state.storage_start = asyncio.create_task(get_backend().start(hot_queries()))
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown."""
     logger.info("Shutting down application...")
-    cassandra_client.close()
+    app.state.storage_start.cancel()
+    # Ends open event streams so the server is not kept waiting on them
+    message_hub.close()
+    # Write queued inbox updates while the backend is still open
+    await inbox_queue.drain()
+    get_backend().close()
 
-if __name__ == "__main__":
+def serve():
+    """
+    Run the API server.
+    
+    By default one worker process per CPU is started, and WEB_WORKERS
+    overrides the count. WEB_RELOAD=true runs a single auto-reloading process
+    for development. The in-memory backend always uses a single worker.
+    
+    Workers are separate processes. Each imports the app and connects its
+    own Cassandra session from the startup hook.
+    """
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    host = os.getenv("WEB_HOST", "0.0.0.0")
+    port = int(os.getenv("WEB_PORT", "8000"))
+    if os.getenv("WEB_RELOAD", "false").lower() in ("1", "true", "yes"):
+        uvicorn.run("app.main:app", host=host, port=port, reload=True)
+        return
+    workers = int(os.getenv("WEB_WORKERS", "0")) or os.cpu_count() or 1
+    if os.getenv("STORAGE_BACKEND", "cassandra").lower() == "memory" and workers > 1:
+        # Every process would hold a separate in-memory database
+        logger.warning("STORAGE_BACKEND=memory serves from a single worker")
+        workers = 1
+    if workers > 1:
+        # The tail buffer, inbox cache and push streams only see the writes
+        # made through their own process, so they are off unless configured
+        os.environ.setdefault("TAIL_BUFFER_SIZE", "0")
+        os.environ.setdefault("INBOX_CACHE_MAX_BYTES", "0")
+        os.environ.setdefault("PUSH_ENABLED", "false")
+    logger.info(f"Starting {workers} worker(s) on {host}:{port}")
+    uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+
+if __name__ == "__main__":
+    serve() 
\ No newline at end of file
@@ -0,0 +1,3 @@
+from app.metrics.registry import MetricsRegistry
+from app.metrics.instruments import observe_query, registry
+from app.metrics.middleware import MetricsMiddleware
@@ -0,0 +1,85 @@
+"""
+The application's metrics and the helpers that record them.
+"""
+import re
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from app.metrics.registry import MetricsRegistry
+
+# Queries per request are small counts; a full page of fan-out reads is not
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 10, 20, 50, 100)
+
+registry = MetricsRegistry()
+
+query_duration = registry.histogram(
+    "cassandra_query_duration_seconds",
+    "Time from issuing a statement until all of its rows were received.",
+    ("op", "table", "statement"),
+)
+query_rows = registry.counter(
+    "cassandra_query_rows_total",
+    "Rows returned by statements.",
+    ("op", "table", "statement"),
+)
+query_errors = registry.counter(
+    "cassandra_query_errors_total",
+    "Statements that failed, by error type.",
+    ("op", "table", "statement", "error"),
+)
+request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to handle an HTTP request, until the response was sent.",
+    ("method", "route", "status"),
+)
+request_queries = registry.histogram(
+    "http_request_queries",
+    "Storage statements issued while handling an HTTP request.",
+    ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+
+# Statements issued by the current request, shared with the tasks it spawns
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|EXISTS)\s+([\w.]+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_labels(query: str) -> Tuple[str, str, str]:
+    """
+    The (op, table, statement) labels of a query.
+    
+    statement is the query text with its whitespace collapsed, so each
+    distinct statement the code issues gets its own series. Batches are
+    labelled as op "batch" and the table of their first statement.
+    """
+    statement = " ".join(query.split())
+    op = statement.split(" ", 1)[0].lower() if statement else ""
+    if op == "begin":
+        op = "batch"
+    match = _TABLE_RE.search(statement)
+    table = match.group(1).split(".")[-1] if match else ""
+    return op, table, statement
+
+
+def observe_query(query: str, seconds: float, rows: int = 0,
+                  error: Optional[BaseException] = None) -> None:
+    """Record one executed statement."""
+    labels = statement_labels(query)
+    query_duration.observe(labels, seconds)
+    if error is not None:
+        query_errors.inc(labels + (type(error).__name__,))
+    elif rows:
+        query_rows.inc(labels, rows)
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def start_request_count() -> List[int]:
+    """Start counting the statements of the current request."""
+    counter = [0]
+    _request_queries.set(counter)
+    return counter
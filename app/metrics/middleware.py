@@ -0,0 +1,46 @@
+"""
+ASGI middleware recording the latency and storage statements of each request.
+"""
+import time
+
+from app.metrics.instruments import request_duration, request_queries, start_request_count
+
+# Label for requests that matched no route, so unknown paths add no series
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records each HTTP request under its route template, e.g.
+    /api/messages/conversation/{conversation_id}, rather than its path.
+    
+    A plain ASGI middleware: it does not buffer responses, so event streams
+    pass through untouched and are timed until they end.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        queries = start_request_count()
+        status = 500
+        
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            request_duration.observe((method, path, str(status)), time.perf_counter() - started)
+            request_queries.observe((method, path), queries[0])
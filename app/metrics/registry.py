@@ -0,0 +1,162 @@
+"""
+Counters and histograms exposed in the Prometheus text format.
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Upper bounds in seconds, from sub-millisecond reads to request timeouts
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets.
+    
+    Counts are kept per bucket and summed only when rendered, so an
+    observation is a bisect and three additions.
+    """
+    
+    __slots__ = ("bounds", "counts", "sum", "count")
+    
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # One count per bound, then one for values above the last bound
+        self.counts: List[int] = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    A named metric and its children, one per combination of label values.
+    
+    Children are created under a lock the first time their labels are seen;
+    after that, recording takes no lock. Updates come from the event loop
+    thread, so they are not lost in practice; an update racing one made from
+    another thread may occasionally be.
+    """
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+    
+    def _child(self, values: LabelValues):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        """The metric's HELP and TYPE lines followed by its samples."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class CounterMetric(Metric):
+    """A monotonically increasing count per label combination."""
+    
+    kind = "counter"
+    
+    def _new_child(self) -> List[float]:
+        return [0]
+    
+    def inc(self, values: LabelValues = (), amount: float = 1) -> None:
+        """Add amount to the counter of the given label values."""
+        self._child(values)[0] += amount
+    
+    def _samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labels, values)} {_format_value(child[0])}"
+
+
+class HistogramMetric(Metric):
+    """A histogram per label combination."""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+    
+    def _new_child(self) -> Histogram:
+        return Histogram(self.buckets)
+    
+    def observe(self, values: LabelValues, value: float) -> None:
+        """Record value in the histogram of the given label values."""
+        self._child(values).observe(value)
+    
+    def _samples(self) -> Iterable[str]:
+        names = self.labels + ("le",)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(names, values + (le,))} {cumulative}"
+            labels = _format_labels(self.labels, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class MetricsRegistry:
+    """The metrics of one process, rendered together for scraping."""
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+    
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> CounterMetric:
+        """Register a counter."""
+        return self._register(CounterMetric(name, documentation, labels))
+    
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> HistogramMetric:
+        """Register a histogram."""
+        return self._register(HistogramMetric(name, documentation, labels, buckets))
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
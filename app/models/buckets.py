@@ -0,0 +1,39 @@
+"""
+Time buckets for the optional bucketed messages layout.
+
+With MESSAGE_BUCKET set to "month" or "day", messages are stored in
+messages_by_bucket, partitioned by (conversation_id, bucket), so no single
+partition grows without bound. The default, "none", keeps the original
+messages table. Pick the granularity once: rows already written are not
+moved when it changes.
+"""
+import os
+from datetime import datetime, timezone
+
+GRANULARITIES = ("none", "month", "day")
+
+MESSAGE_BUCKET = os.getenv("MESSAGE_BUCKET", "none").lower()
+if MESSAGE_BUCKET not in GRANULARITIES:
+    raise ValueError(f"Unknown MESSAGE_BUCKET '{MESSAGE_BUCKET}', expected one of {', '.join(GRANULARITIES)}")
+
+
+def bucketing_enabled() -> bool:
+    """Whether messages are stored in time-bucketed partitions."""
+    return MESSAGE_BUCKET != "none"
+
+
+def bucket_for(created_at: datetime, granularity: str = MESSAGE_BUCKET) -> int:
+    """
+    Bucket of a message timestamp, e.g. 202410 by month or 20241031 by day.
+    
+    Buckets sort in time order, so newer buckets compare greater. Aware
+    timestamps are converted to UTC first; naive ones are taken as UTC, as
+    the driver returns them.
+    """
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == "month":
+        return created_at.year * 100 + created_at.month
+    if granularity == "day":
+        return (created_at.year * 100 + created_at.month) * 100 + created_at.day
+    raise ValueError(f"Bucketing is disabled (MESSAGE_BUCKET={granularity})")
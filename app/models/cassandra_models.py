@@ -4,11 +4,488 @@ Students should implement these models based on their database schema design.
 """
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import asyncio
-import math
+import logging
+import os
 
-from app.db.cassandra_client import cassandra_client
+from app.cache import InboxCache, LRUCache, TailBuffer
+from app.db.backend import PROFILE_READ, PROFILE_WRITE, get_backend
+from app.models.buckets import bucket_for, bucketing_enabled
+from app.models.keys import conversation_uuid_for, user_uuid, uuid_to_int
+from app.models.pagination import encode_cursor, decode_cursor
+from app.models.records import message_records
+from app.models.write_behind import CoalescingWriteQueue
+from app.push import MessageHub
+
+logger = logging.getLogger(__name__)
+
+# Cassandra, or the in-memory engine when STORAGE_BACKEND=memory
+storage = get_backend()
+
+# Public integer conversation ID -> conversation UUID. Entries never change once
+# written, so the cache only needs a size bound.
+conversation_id_cache = LRUCache(int(os.getenv("CONVERSATION_ID_CACHE_SIZE", "100000")))
+
+# Inbox pages keyed by (user_id, page, limit, include_total), dropped for both
+# participants on every send.
+inbox_cache = InboxCache(
+    max_bytes=int(os.getenv("INBOX_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("INBOX_CACHE_TTL", "30"))
+)
+
+# Newest messages of recently read or written conversations, so first-page
+# history reads of active chats need no round trip. Tails are read again after
+# TAIL_BUFFER_TTL seconds, which bounds how long messages sent through other
+# processes can be missing from them.
+tail_buffer = TailBuffer(
+    capacity=int(os.getenv("TAIL_BUFFER_SIZE", "50")),
+    max_conversations=int(os.getenv("TAIL_BUFFER_CONVERSATIONS", "10000")),
+    ttl=float(os.getenv("TAIL_BUFFER_TTL", "5"))
+)
+
+# Open push connections by public user ID; every stored message is published
+# to both participants. A send only reaches the streams held by its own
+# process, so push is turned off when several processes serve the API.
+PUSH_ENABLED = os.getenv("PUSH_ENABLED", "true").lower() in ("1", "true", "yes")
+message_hub = MessageHub(
+    max_queue=int(os.getenv("PUSH_QUEUE_SIZE", "256")),
+    slow_consumer=os.getenv("PUSH_SLOW_CONSUMER", "disconnect"),
+    max_subscriptions_per_user=int(os.getenv("PUSH_MAX_CONNECTIONS_PER_USER", "16"))
+)
+
+# (user UUID, conversation UUID) -> last_message_at of the inbox row this
+# process last wrote for the user and conversation. Only consulted together
+# with inbox_index, so sends racing in this process delete the right row
+inbox_positions = LRUCache(int(os.getenv("INBOX_POSITION_CACHE_SIZE", "100000")))
+
+# Bucketed conversations whose bucket rows this process has written, so
+# sends skip rewriting them
+known_buckets = LRUCache(int(os.getenv("KNOWN_BUCKETS_CACHE_SIZE", "100000")))
+
+PARTICIPANT_INSERT = "INSERT INTO conversation_participants (conversation_id, user_id) VALUES (?, ?)"
+MESSAGE_INSERT = "INSERT INTO messages (conversation_id, message_id, sender_id, content, created_at) VALUES (?, ?, ?, ?, ?)"
+BUCKETED_MESSAGE_INSERT = "INSERT INTO messages_by_bucket (conversation_id, bucket, message_id, sender_id, content, created_at) VALUES (?, ?, ?, ?, ?, ?)"
+CONVERSATION_BUCKET_INSERT = "INSERT INTO conversation_buckets (conversation_id, bucket) VALUES (?, ?)"
+INBOX_INSERT = "INSERT INTO conversations (user_id, conversation_id, other_user_id, last_message_at, last_message_content) VALUES (?, ?, ?, ?, ?)"
+INBOX_DELETE = "DELETE FROM conversations WHERE user_id = ? AND last_message_at = ? AND conversation_id = ?"
+INBOX_INDEX_INSERT = "INSERT INTO inbox_index (user_id, conversation_id, last_message_at) VALUES (?, ?, ?)"
+CONVERSATION_ID_INSERT = "INSERT INTO conversation_ids (id, conversation_id) VALUES (?, ?) IF NOT EXISTS"
+MESSAGE_COUNT_INCREMENT = "UPDATE conversation_message_counts SET message_count = message_count + ? WHERE conversation_id = ?"
+CONVERSATION_COUNT_INCREMENT = "UPDATE user_conversation_counts SET conversation_count = conversation_count + 1 WHERE user_id = ?"
+INBOX_SELECT = "SELECT * FROM conversations WHERE user_id = ? LIMIT ?"
+INBOX_INDEX_SELECT = "SELECT last_message_at FROM inbox_index WHERE user_id = ? AND conversation_id = ?"
+CONVERSATION_BUCKETS_SELECT = "SELECT bucket FROM conversation_buckets WHERE conversation_id = ?"
+CONVERSATION_ID_SELECT = "SELECT conversation_id FROM conversation_ids WHERE id = ?"
+PARTICIPANTS_SELECT = "SELECT user_id FROM conversation_participants WHERE conversation_id = ? LIMIT 2"
+MESSAGE_COUNT_SELECT = "SELECT message_count FROM conversation_message_counts WHERE conversation_id = ?"
+CONVERSATION_COUNT_SELECT = "SELECT conversation_count FROM user_conversation_counts WHERE user_id = ?"
+
+Statement = Tuple[str, Tuple]
+# (user, conversation, other user, last_message_at, content)
+InboxUpdate = Tuple[uuid.UUID, uuid.UUID, uuid.UUID, datetime, str]
+
+def message_queries(table: str, partition: str) -> Dict[str, str]:
+    """
+    Reads of one messages partition, keyed by the restriction they apply.
+    
+    The after queries read oldest first, the exact reverse of the clustering
+    order, for catching up from a known position.
+    """
+    ascending = "ORDER BY created_at ASC, message_id DESC"
+    return {
+        'newest': f"SELECT * FROM {table} WHERE {partition} LIMIT ?",
+        'before': f"SELECT * FROM {table} WHERE {partition} AND created_at < ? LIMIT ?",
+        'same_time': f"SELECT * FROM {table} WHERE {partition} AND created_at = ? AND message_id > ? LIMIT ?",
+        'after': f"SELECT * FROM {table} WHERE {partition} AND created_at > ? {ascending} LIMIT ?",
+        'same_time_after': f"SELECT * FROM {table} WHERE {partition} AND created_at = ? AND message_id < ? {ascending} LIMIT ?",
+    }
+
+MESSAGE_QUERIES = message_queries("messages", "conversation_id = ?")
+BUCKETED_MESSAGE_QUERIES = message_queries("messages_by_bucket", "conversation_id = ? AND bucket = ?")
+
+# Lower bound of every timestamp, for reads from the start of a partition
+EPOCH = datetime(1970, 1, 1)
+
+def hot_queries() -> List[str]:
+    """Statements on the request path, prepared at startup before serving."""
+    queries = [
+        PARTICIPANT_INSERT, INBOX_INSERT, INBOX_DELETE, INBOX_INDEX_INSERT,
+        CONVERSATION_ID_INSERT, MESSAGE_COUNT_INCREMENT, CONVERSATION_COUNT_INCREMENT,
+        INBOX_SELECT, INBOX_INDEX_SELECT, CONVERSATION_ID_SELECT, PARTICIPANTS_SELECT,
+        MESSAGE_COUNT_SELECT, CONVERSATION_COUNT_SELECT,
+    ]
+    if bucketing_enabled():
+        queries += [BUCKETED_MESSAGE_INSERT, CONVERSATION_BUCKET_INSERT, CONVERSATION_BUCKETS_SELECT]
+        queries += BUCKETED_MESSAGE_QUERIES.values()
+    else:
+        queries.append(MESSAGE_INSERT)
+        queries += MESSAGE_QUERIES.values()
+    return queries
+
+# Keeps unlogged batches under Cassandra's batch size warning threshold
+MAX_BATCH_STATEMENTS = int(os.getenv("CASSANDRA_MAX_BATCH_STATEMENTS", "50"))
+
+class PartialWriteError(Exception):
+    """
+    Raised when a message was stored but some of its secondary writes
+    (inbox rows, ID mapping) still failed after a retry.
+    
+    The message itself is durable; ``result`` holds it and ``errors`` the
+    exceptions of the partitions that could not be written.
+    """
+    
+    def __init__(self, result: Dict[str, Any], errors: List[Exception]):
+        super().__init__(f"Message stored but {len(errors)} secondary write(s) failed: {errors[0]}")
+        self.result = result
+        self.errors = errors
+
+async def update_counters(statements: List[Statement]) -> None:
+    """
+    Apply counter updates concurrently.
+    
+    Counter increments are not idempotent, so they are never retried, and a
+    failure is only logged: counters may drift slightly but never fail a send.
+    """
+    results = await asyncio.gather(
+        *(storage.aexecute(query, params, profile=PROFILE_WRITE) for query, params in statements),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.warning(f"Error updating counter: {str(result)}")
+
+async def register_conversation(conversation_uuid: uuid.UUID,
+                                user1_uuid: uuid.UUID,
+                                user2_uuid: uuid.UUID) -> bool:
+    """
+    Record the integer ID -> UUID mapping of a conversation.
+    
+    The mapping is inserted with IF NOT EXISTS, so exactly one writer sees it
+    applied and counts the conversation for both users. When it is not
+    applied the stored mapping is cached instead, which differs from ours if
+    another conversation already took the ID.
+    
+    Returns:
+        True if this call created the conversation
+    """
+    conversation_id = uuid_to_int(conversation_uuid)
+    rows = await storage.aexecute(CONVERSATION_ID_INSERT, (conversation_id, conversation_uuid),
+                                  profile=PROFILE_WRITE)
+    if not rows:
+        return False
+    created = bool(rows[0]['[applied]'])
+    if created:
+        await update_counters([
+            (CONVERSATION_COUNT_INCREMENT, (user1_uuid,)),
+            (CONVERSATION_COUNT_INCREMENT, (user2_uuid,)),
+        ])
+        conversation_id_cache.put(conversation_id, conversation_uuid)
+    else:
+        stored = rows[0]['conversation_id']
+        if stored != conversation_uuid:
+            logger.warning(f"Conversation {conversation_uuid} shares public ID {conversation_id} with {stored}")
+        conversation_id_cache.put(conversation_id, stored)
+    return created
+
+async def read_counter(query: str, key: uuid.UUID, include: bool = True) -> Optional[int]:
+    """
+    Read a single counter value, treating a missing row as zero.
+    
+    Returns None without querying when include is False.
+    """
+    if not include:
+        return None
+    rows = await storage.aexecute(query, (key,), profile=PROFILE_READ)
+    if not rows:
+        return 0
+    return next(iter(rows[0].values())) or 0
+
+async def write_groups(groups: List[List[Statement]]) -> List[Optional[BaseException]]:
+    """
+    Write groups of statements, one unlogged batch per group, all at once.
+    
+    Each group should target a single partition so Cassandra applies it as
+    one mutation; the whole fan-out then costs about one round trip. The
+    statements written this way are upserts with client-chosen keys, so a
+    group that fails is retried once.
+    
+    Returns:
+        For each group, None if it was written or the error it failed with
+    """
+    results = list(await asyncio.gather(
+        *(storage.aexecute_batch(group, profile=PROFILE_WRITE) for group in groups),
+        return_exceptions=True
+    ))
+    failed = [index for index, result in enumerate(results) if isinstance(result, BaseException)]
+    if failed:
+        retried = await asyncio.gather(
+            *(storage.aexecute_batch(groups[index], profile=PROFILE_WRITE) for index in failed),
+            return_exceptions=True
+        )
+        for index, result in zip(failed, retried):
+            results[index] = result
+    return [result if isinstance(result, BaseException) else None for result in results]
+
+async def inbox_statements(updates: List[InboxUpdate]) -> Dict[uuid.UUID, List[Tuple[int, List[Statement]]]]:
+    """
+    Build the statements moving inbox rows to their conversations' newest message.
+    
+    conversations clusters on last_message_at, so a conversation moving up
+    means deleting its previous row and inserting the new one, or the inbox
+    would keep one row per message. The previous position is read from
+    inbox_index on every send, since other processes move rows too; a newer
+    position written by a send still in flight in this process wins over
+    it. All three writes share the user's partition. Updates older than the
+    previous position are dropped.
+    
+    Args:
+        updates: (user, conversation, other user, last_message_at, content) tuples
+    
+    Returns:
+        For each user whose partition they target, the index and statements
+        of each update; an update's statements must share a batch
+    """
+    keys = list({(user, conversation) for user, conversation, _, _, _ in updates})
+    found = await asyncio.gather(*(
+        storage.aexecute(INBOX_INDEX_SELECT, key)
+        for key in keys
+    ))
+    positions = {}
+    for key, rows in zip(keys, found):
+        stored = rows[0]['last_message_at'] if rows else None
+        # A send in this process may have moved the row while we were reading
+        written = inbox_positions.get(key)
+        positions[key] = written if stored is None or (written is not None and written > stored) else stored
+    
+    statements: Dict[uuid.UUID, List[Tuple[int, List[Statement]]]] = {}
+    for index, (user, conversation, other, last_message_at, content) in enumerate(updates):
+        previous = positions[(user, conversation)]
+        if previous is not None and previous > last_message_at:
+            continue
+        update = []
+        if previous is not None and previous != last_message_at:
+            update.append((INBOX_DELETE, (user, previous, conversation)))
+        update.append((INBOX_INSERT, (user, conversation, other, last_message_at, content)))
+        update.append((INBOX_INDEX_INSERT, (user, conversation, last_message_at)))
+        statements.setdefault(user, []).append((index, update))
+        positions[(user, conversation)] = last_message_at
+        # Recorded before the write lands so concurrent sends delete the right row
+        inbox_positions.put((user, conversation), last_message_at)
+    return statements
+
+async def inbox_batches(updates: List[InboxUpdate]) -> List[Tuple[uuid.UUID, List[int], List[Statement]]]:
+    """
+    Group inbox updates into batches of at most MAX_BATCH_STATEMENTS per user partition.
+    
+    A delete and its insert must land together, so batches hold whole updates.
+    
+    Returns:
+        (user, indices of the updates, statements) of each batch
+    """
+    batches = []
+    for user, user_updates in (await inbox_statements(updates)).items():
+        indices: List[int] = []
+        chunk: List[Statement] = []
+        for index, update in user_updates:
+            if chunk and len(chunk) + len(update) > MAX_BATCH_STATEMENTS:
+                batches.append((user, indices, chunk))
+                indices, chunk = [], []
+            indices.append(index)
+            chunk += update
+        batches.append((user, indices, chunk))
+    return batches
+
+async def write_inbox_updates(entries: List[Tuple[int, InboxUpdate]]) -> List[Optional[BaseException]]:
+    """
+    Write queued inbox updates and drop the cached inbox pages of their users.
+    
+    Args:
+        entries: (public user ID, update) pairs
+    
+    Returns:
+        For each entry, None if it was written or skipped as outdated, or the
+        error it failed with
+    """
+    batches = await inbox_batches([update for _, update in entries])
+    errors = await write_groups([statements for _, _, statements in batches])
+    results: List[Optional[BaseException]] = [None] * len(entries)
+    for (user, indices, statements), error in zip(batches, errors):
+        if error is not None:
+            forget_inbox_positions(user, statements)
+            for index in indices:
+                results[index] = error
+    for user_id in {user_id for user_id, _ in entries}:
+        inbox_cache.invalidate(user_id)
+    return results
+
+# With INBOX_WRITE_BEHIND, sends store their messages and leave the inbox rows
+# to this queue, which merges the updates of each (user, conversation) made
+# within INBOX_FLUSH_WINDOW seconds into one write
+INBOX_WRITE_BEHIND = os.getenv("INBOX_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+inbox_queue = CoalescingWriteQueue(
+    flush=write_inbox_updates,
+    window=float(os.getenv("INBOX_FLUSH_WINDOW", "0.5")),
+    max_pending=int(os.getenv("INBOX_QUEUE_MAX_PENDING", "10000"))
+)
+
+def forget_inbox_positions(user: uuid.UUID, statements: List[Statement]) -> None:
+    """Drop cached positions touched by a failed inbox write, whose outcome is unknown."""
+    for query, params in statements:
+        if query == INBOX_INDEX_INSERT:
+            inbox_positions.pop((user, params[1]))
+
+def publish_message(message: Dict[str, Any]) -> None:
+    """Push a stored message to the open connections of both participants."""
+    if not PUSH_ENABLED:
+        return
+    event = {
+        'id': uuid_to_int(message['id']),
+        'conversation_id': uuid_to_int(message['conversation_id']),
+        'sender_id': message['sender_id'],
+        'receiver_id': message['receiver_id'],
+        'content': message['content'],
+        'created_at': message['created_at'].isoformat()
+    }
+    message_hub.publish(message['sender_id'], event)
+    if message['receiver_id'] != message['sender_id']:
+        message_hub.publish(message['receiver_id'], event)
+
+def chunked(statements: List[Statement], size: int) -> List[List[Statement]]:
+    """Split one partition's statements into batches of at most size statements."""
+    return [statements[start:start + size] for start in range(0, len(statements), size)]
+
+async def read_partition_messages(queries: Dict[str, str],
+                                  key: Tuple,
+                                  fetch: int,
+                                  before: Optional[datetime] = None,
+                                  after_key: Optional[Tuple[datetime, uuid.UUID]] = None) -> List[Dict[str, Any]]:
+    """
+    Read up to fetch rows of one messages partition, newest first.
+    
+    after_key is the (created_at, message_id) of the last row already read:
+    rows sharing its created_at with a greater message_id come next, then
+    rows with an older created_at, read concurrently. before is an exclusive
+    timestamp bound.
+    """
+    if after_key:
+        created_at, message_id = after_key
+        same_time, older = await asyncio.gather(
+            storage.aexecute(queries['same_time'], key + (created_at, message_id, fetch), profile=PROFILE_READ),
+            storage.aexecute(queries['before'], key + (created_at, fetch), profile=PROFILE_READ),
+        )
+        return (same_time + older)[:fetch]
+    if before:
+        return await storage.aexecute(queries['before'], key + (before, fetch), profile=PROFILE_READ)
+    return await storage.aexecute(queries['newest'], key + (fetch,), profile=PROFILE_READ)
+
+async def read_messages(conversation_id: uuid.UUID,
+                        fetch: int,
+                        before: Optional[datetime] = None,
+                        after_key: Optional[Tuple[datetime, uuid.UUID]] = None) -> List[Dict[str, Any]]:
+    """
+    Read up to fetch messages of a conversation, newest first.
+    
+    In the bucketed layout the conversation's non-empty buckets are listed
+    from conversation_buckets, then walked newest first until fetch rows are
+    read; empty buckets are never queried. Only the bucket holding the
+    bound needs the bound applied, older buckets are read from their start.
+    """
+    if not bucketing_enabled():
+        return await read_partition_messages(MESSAGE_QUERIES, (conversation_id,), fetch, before, after_key)
+    
+    bucket_rows = await storage.aexecute(
+        CONVERSATION_BUCKETS_SELECT, (conversation_id,), profile=PROFILE_READ
+    )
+    buckets = [row['bucket'] for row in bucket_rows]
+    bound = after_key[0] if after_key else before
+    bound_bucket = bucket_for(bound) if bound else None
+    rows: List[Dict[str, Any]] = []
+    for bucket in buckets:
+        if bound_bucket is not None and bucket > bound_bucket:
+            continue
+        bounded = bucket == bound_bucket
+        rows += await read_partition_messages(
+            BUCKETED_MESSAGE_QUERIES, (conversation_id, bucket), fetch - len(rows),
+            before=before if bounded else None,
+            after_key=after_key if bounded else None
+        )
+        if len(rows) >= fetch:
+            break
+    return rows
+
+async def read_partition_messages_after(queries: Dict[str, str],
+                                        key: Tuple,
+                                        fetch: int,
+                                        after: Optional[datetime] = None,
+                                        after_key: Optional[Tuple[datetime, uuid.UUID]] = None) -> List[Dict[str, Any]]:
+    """
+    Read up to fetch rows of one messages partition, oldest first.
+    
+    The mirror image of read_partition_messages: after_key is the
+    (created_at, message_id) of the last row already read, so rows sharing
+    its created_at with a smaller message_id come next, then rows with a
+    newer created_at. after is an exclusive timestamp bound. Without either
+    the partition is read from its oldest row.
+    """
+    if after_key:
+        created_at, message_id = after_key
+        same_time, newer = await asyncio.gather(
+            storage.aexecute(queries['same_time_after'], key + (created_at, message_id, fetch), profile=PROFILE_READ),
+            storage.aexecute(queries['after'], key + (created_at, fetch), profile=PROFILE_READ),
+        )
+        return (same_time + newer)[:fetch]
+    return await storage.aexecute(queries['after'], key + (after or EPOCH, fetch), profile=PROFILE_READ)
+
+async def read_messages_after(conversation_id: uuid.UUID,
+                              fetch: int,
+                              after: Optional[datetime] = None,
+                              after_key: Optional[Tuple[datetime, uuid.UUID]] = None) -> List[Dict[str, Any]]:
+    """
+    Read up to fetch messages of a conversation newer than a bound, oldest first.
+    
+    In the bucketed layout the buckets from the bound's onwards are walked
+    oldest first; as in read_messages only the bound's bucket needs it applied.
+    """
+    if not bucketing_enabled():
+        return await read_partition_messages_after(MESSAGE_QUERIES, (conversation_id,), fetch, after, after_key)
+    
+    bucket_rows = await storage.aexecute(
+        CONVERSATION_BUCKETS_SELECT, (conversation_id,), profile=PROFILE_READ
+    )
+    bound = after_key[0] if after_key else after
+    bound_bucket = bucket_for(bound) if bound else None
+    rows: List[Dict[str, Any]] = []
+    for bucket in reversed([row['bucket'] for row in bucket_rows]):
+        if bound_bucket is not None and bucket < bound_bucket:
+            continue
+        bounded = bucket == bound_bucket
+        rows += await read_partition_messages_after(
+            BUCKETED_MESSAGE_QUERIES, (conversation_id, bucket), fetch - len(rows),
+            after=after if bounded else None,
+            after_key=after_key if bounded else None
+        )
+        if len(rows) >= fetch:
+            break
+    return rows
+
+async def resolve_conversation_uuid(conversation_id: int) -> Optional[uuid.UUID]:
+    """
+    Resolve a public integer conversation ID to the conversation UUID.
+    
+    Hits the in-process cache first and falls back to a single-partition read
+    of conversation_ids. Returns None for unknown IDs.
+    """
+    conv_uuid = conversation_id_cache.get(conversation_id)
+    if conv_uuid is None:
+        rows = await storage.aexecute(
+            CONVERSATION_ID_SELECT, (conversation_id,), profile=PROFILE_READ
+        )
+        if not rows:
+            return None
+        conv_uuid = rows[0]['conversation_id']
+        conversation_id_cache.put(conversation_id, conv_uuid)
+    return conv_uuid
 
 class MessageModel:
     """
@@ -26,102 +503,312 @@ class MessageModel:
         """
         Create a new message.
         
-        Students should decide what parameters are needed based on their schema design.
+        The message is written together with the conversation participants in
+        one batch; inbox rows and the ID mapping are written concurrently.
+        Once stored, the message is pushed to both participants' open
+        connections.
+        
+        Raises:
+            PartialWriteError: If the message was stored but a secondary write failed
         """
         try:
-            sender_id_str = f"user-{sender_id}"
-            receiver_id_str = f"user-{receiver_id}"
-            namespace = uuid.NAMESPACE_OID  
-            sender_uuid = uuid.uuid5(namespace, sender_id_str)
-            receiver_uuid = uuid.uuid5(namespace, receiver_id_str)
-            conversation_id = uuid.uuid4()
-            message_id = uuid.uuid4()
-            created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-            cassandra_client.execute(
-                f"INSERT INTO conversation_participants (conversation_id, user_id) VALUES ({conversation_id}, {sender_uuid})"
-            )
-            cassandra_client.execute(
-                f"INSERT INTO conversation_participants (conversation_id, user_id) VALUES ({conversation_id}, {receiver_uuid})"
-            )
-            cassandra_client.execute(
-                f"INSERT INTO messages (conversation_id, message_id, sender_id, content, created_at) VALUES ({conversation_id}, {message_id}, {sender_uuid}, '{content}', '{created_at}')"
-            )
-            cassandra_client.execute(
-                f"INSERT INTO conversations (user_id, conversation_id, other_user_id, last_message_at, last_message_content) VALUES ({sender_uuid}, {conversation_id}, {receiver_uuid}, '{created_at}', '{content}')"
-            )
-            cassandra_client.execute(
-                f"INSERT INTO conversations (user_id, conversation_id, other_user_id, last_message_at, last_message_content) VALUES ({receiver_uuid}, {conversation_id}, {sender_uuid}, '{created_at}', '{content}')"
-            )
-            return {
-                'id': message_id,
-                'conversation_id': conversation_id,
-                'sender_id': sender_id,
-                'receiver_id': receiver_id,
+            outcome = (await MessageModel.create_messages([{
                 'content': content,
-                'created_at': datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S.%f")
-            }
+                'sender_id': sender_id,
+                'receiver_id': receiver_id
+            }]))[0]
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        except PartialWriteError as e:
+            logger.warning(f"Partial write in create_message: {str(e)}")
+            raise
         except Exception as e:
-            print(f"Error in create_message: {str(e)}")
+            logger.exception(f"Error in create_message: {str(e)}")
             raise
     
     @staticmethod
-    async def get_conversation_messages(conversation_id: int, page: int = 1, limit: int = 20) -> Dict[str, Any]:
+    async def create_messages(messages: List[Dict[str, Any]]) -> List[Any]:
         """
-        Get messages for a conversation with pagination.
+        Create several messages at once, grouping their writes by partition.
+        
+        Each conversation partition gets the participants and all of its
+        messages, batched CASSANDRA_MAX_BATCH_STATEMENTS at a time. In the
+        bucketed layout messages go to their (conversation, bucket) partitions
+        instead, and the participants travel with any new bucket rows. Each inbox
+        partition gets only the newest message per conversation. All groups
+        are dispatched together within the client's in-flight window; once
+        they are done, each message counter is incremented once by the number
+        of the conversation's messages that were stored. With
+        INBOX_WRITE_BEHIND the inbox updates of stored messages are queued
+        instead, and their failures are not reported here.
+        
+        Args:
+            messages: Items with content, sender_id and receiver_id
         
-        Students should decide what parameters are needed and how to implement pagination.
+        Returns:
+            For each item, the created message or the exception that failed
+            it. A PartialWriteError means the message was stored but a
+            secondary write failed; its ``result`` holds the message.
         """
-        try:
-            try:
-                all_convs_query = "SELECT conversation_id FROM conversation_participants"
-                all_convs = cassandra_client.execute(all_convs_query)
-                uuid_to_int = lambda uuid_obj: int(str(uuid_obj).replace('-', '')[:10], 16)
-                conv_uuid = None
-                for row in all_convs:
-                    conv_id = row['conversation_id']
-                    if uuid_to_int(conv_id) == conversation_id:
-                        conv_uuid = conv_id
-                        break
-                if not conv_uuid:
-                    return {
-                        'total': 0,
-                        'page': page,
-                        'limit': limit,
-                        'data': []
-                    }
-            except Exception as e:
-                print(f"Error finding conversation: {str(e)}")
-                namespace = uuid.NAMESPACE_OID
-                conv_uuid = uuid.uuid5(namespace, f"conversation-{conversation_id}")
-            
+        now = datetime.utcnow()
+        # Cassandra timestamps have millisecond precision
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        
+        results = []
+        placements = []
+        rows_by_conversation: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+        participants: Dict[uuid.UUID, Tuple[uuid.UUID, uuid.UUID]] = {}
+        user_ids: Dict[uuid.UUID, int] = {}
+        for message in messages:
+            sender_uuid = user_uuid(message['sender_id'])
+            receiver_uuid = user_uuid(message['receiver_id'])
+            conversation_id = conversation_uuid_for(sender_uuid, receiver_uuid)
+            rows = rows_by_conversation.setdefault(conversation_id, [])
+            participants.setdefault(conversation_id, (sender_uuid, receiver_uuid))
+            created_at = now
+            message_id = uuid.uuid4()
+            placements.append((conversation_id, len(rows), sender_uuid, receiver_uuid))
+            rows.append({
+                'conversation_id': conversation_id,
+                'created_at': created_at,
+                'message_id': message_id,
+                'content': message['content'],
+                'sender_id': sender_uuid
+            })
+            results.append({
+                'id': message_id,
+                'conversation_id': conversation_id,
+                'sender_id': message['sender_id'],
+                'receiver_id': message['receiver_id'],
+                'content': message['content'],
+                'created_at': created_at
+            })
+            user_ids[sender_uuid] = message['sender_id']
+            user_ids[receiver_uuid] = message['receiver_id']
+        # Messages of a request share its timestamp; rows with equal created_at
+        # list newest first by ascending message_id, so a conversation's
+        # messages get descending IDs to keep the order they were sent in
+        for rows in rows_by_conversation.values():
+            if len(rows) > 1:
+                message_ids = sorted((row['message_id'] for row in rows), key=lambda value: value.int, reverse=True)
+                for row, message_id in zip(rows, message_ids):
+                    row['message_id'] = message_id
+        for result, (conversation_id, position, _, _) in zip(results, placements):
+            result['id'] = rows_by_conversation[conversation_id][position]['message_id']
+        
+        groups: List[List[Statement]] = []
+        # Per group: ('messages', conversation, positions of its messages) or
+        # ('inbox', user, None); bucket metadata groups carry no positions
+        group_owners: List[Tuple[str, uuid.UUID, Optional[List[int]]]] = []
+        new_buckets: Dict[uuid.UUID, List[int]] = {}
+        inbox_updates: List[InboxUpdate] = []
+        for conversation_id, rows in rows_by_conversation.items():
+            user1_uuid, user2_uuid = participants[conversation_id]
+            # Rewriting the participants is idempotent and rides in the same mutation
+            shared = [
+                (PARTICIPANT_INSERT, (conversation_id, user1_uuid)),
+                (PARTICIPANT_INSERT, (conversation_id, user2_uuid)),
+            ]
+            if bucketing_enabled():
+                # Messages go to their (conversation, bucket) partitions; the
+                # participants and any new bucket rows share the conversation's
+                partitions: Dict[int, List[Tuple[Statement, Optional[int]]]] = {}
+                for position, row in enumerate(rows):
+                    bucket = bucket_for(row['created_at'])
+                    partitions.setdefault(bucket, []).append((
+                        (BUCKETED_MESSAGE_INSERT, (conversation_id, bucket, row['message_id'], row['sender_id'], row['content'], row['created_at'])),
+                        position
+                    ))
+                unknown = [bucket for bucket in partitions if (conversation_id, bucket) not in known_buckets]
+                if unknown:
+                    new_buckets[conversation_id] = unknown
+                    groups.append(shared + [(CONVERSATION_BUCKET_INSERT, (conversation_id, bucket)) for bucket in unknown])
+                    group_owners.append(('messages', conversation_id, None))
+                partition_writes = list(partitions.values())
+            else:
+                partition_writes = [[(statement, None) for statement in shared] + [
+                    ((MESSAGE_INSERT, (conversation_id, row['message_id'], row['sender_id'], row['content'], row['created_at'])), position)
+                    for position, row in enumerate(rows)
+                ]]
+            for writes in partition_writes:
+                for chunk in chunked(writes, MAX_BATCH_STATEMENTS):
+                    groups.append([statement for statement, _ in chunk])
+                    group_owners.append(('messages', conversation_id, [position for _, position in chunk if position is not None]))
+            newest = rows[-1]
+            inbox_updates.append((user1_uuid, conversation_id, user2_uuid, newest['created_at'], newest['content']))
+            inbox_updates.append((user2_uuid, conversation_id, user1_uuid, newest['created_at'], newest['content']))
+        if not INBOX_WRITE_BEHIND:
+            for owner_uuid, _, statements in await inbox_batches(inbox_updates):
+                groups.append(statements)
+                group_owners.append(('inbox', owner_uuid, None))
+        
+        # Conversations this process has not seen yet are registered alongside
+        unregistered = [
+            conversation_id for conversation_id in rows_by_conversation
+            if uuid_to_int(conversation_id) not in conversation_id_cache
+        ]
+        outcome = await asyncio.gather(
+            write_groups(groups),
+            *(register_conversation(conversation_id, *participants[conversation_id])
+              for conversation_id in unregistered),
+            return_exceptions=True
+        )
+        group_errors = outcome[0]
+        
+        message_errors = {}
+        conversation_errors = {}
+        inbox_errors = {}
+        for (kind, owner, positions), group, error in zip(group_owners, groups, group_errors):
+            if kind == 'inbox':
+                if error is not None:
+                    inbox_errors.setdefault(owner, error)
+                    forget_inbox_positions(owner, group)
+            elif positions is None:
+                # Without their bucket rows, messages in new buckets cannot be read
+                if error is not None:
+                    conversation_errors[owner] = error
+                else:
+                    for bucket in new_buckets[owner]:
+                        known_buckets.put((owner, bucket), True)
+            elif error is not None:
+                for position in positions:
+                    message_errors[(owner, position)] = error
+        
+        failed_conversations = {conversation_id for conversation_id, _ in message_errors} | set(conversation_errors)
+        
+        # Counters only count stored messages, so they are incremented after
+        # the writes, together with retrying failed registrations
+        stored_counts = [
+            (conversation_id, sum(1 for position in range(len(rows)) if (conversation_id, position) not in message_errors))
+            for conversation_id, rows in rows_by_conversation.items()
+            if conversation_id not in conversation_errors
+        ]
+        retries = [
+            conversation_id for conversation_id, result in zip(unregistered, outcome[1:])
+            if isinstance(result, BaseException)
+        ]
+        retried = await asyncio.gather(
+            update_counters([
+                (MESSAGE_COUNT_INCREMENT, (count, conversation_id))
+                for conversation_id, count in stored_counts if count
+            ]),
+            *(register_conversation(conversation_id, *participants[conversation_id])
+              for conversation_id in retries),
+            return_exceptions=True
+        )
+        registration_errors = {
+            conversation_id: result for conversation_id, result in zip(retries, retried[1:])
+            if isinstance(result, BaseException)
+        }
+        if INBOX_WRITE_BEHIND:
+            # Inbox rows follow once the messages are stored; the flush drops
+            # the cached inbox pages
+            for update in inbox_updates:
+                if update[1] not in failed_conversations:
+                    await inbox_queue.put(update[:2], (user_ids[update[0]], update), update[3])
+        else:
+            # Even a failed send may have updated an inbox row
+            for user_id in user_ids.values():
+                inbox_cache.invalidate(user_id)
+        for conversation_id, rows in rows_by_conversation.items():
+            if conversation_id in failed_conversations:
+                # Some of these messages may or may not have landed
+                tail_buffer.discard(conversation_id)
+            else:
+                for row in rows:
+                    tail_buffer.append(conversation_id, row)
+        
+        for index, (conversation_id, position, sender_uuid, receiver_uuid) in enumerate(placements):
+            message_error = conversation_errors.get(conversation_id) or message_errors.get((conversation_id, position))
+            if message_error is not None:
+                results[index] = message_error
+                continue
+            errors = [
+                error for error in (
+                    inbox_errors.get(sender_uuid),
+                    inbox_errors.get(receiver_uuid),
+                    registration_errors.get(conversation_id),
+                ) if error is not None
+            ]
+            publish_message(results[index])
+            if errors:
+                results[index] = PartialWriteError(results[index], errors)
+        return results
+    
+    @staticmethod
+    async def _read_message_page(conv_uuid: uuid.UUID,
+                                 limit: int,
+                                 cursor: Optional[str] = None,
+                                 before_timestamp: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Read one page of a conversation's messages, newest first.
         
-            count_query = f"SELECT COUNT(*) as count FROM messages WHERE conversation_id = {conv_uuid}"
-            count_result = cassandra_client.execute(count_query)
-            total_count = count_result[0]['count'] if count_result and count_result[0]['count'] else 0
-            offset = (page - 1) * limit
-            total_pages = math.ceil(total_count / limit) if total_count > 0 else 1
-            messages_query = f"SELECT * FROM messages WHERE conversation_id = {conv_uuid} LIMIT {limit}"
-            message_rows = cassandra_client.execute(messages_query)
+        With a cursor the page starts right after the (created_at, message_id)
+        key it encodes: rows sharing that created_at with a greater message_id,
+        then rows with an older created_at. Both are single-partition clustering
+        range reads, so a deep page costs the same as the first one. First
+        pages that fit in the tail buffer are served from memory.
+        
+        Returns:
+            The rows of the page and the cursor for the next page, if any
+        """
+        # One extra row tells us whether another page exists
+        fetch = limit + 1
+        if cursor:
+            rows = await read_messages(conv_uuid, fetch, after_key=decode_cursor(cursor))
+        elif before_timestamp:
+            rows = await read_messages(conv_uuid, fetch, before=before_timestamp)
+        elif fetch <= tail_buffer.capacity:
+            rows = tail_buffer.read(conv_uuid, fetch)
+            if rows is None:
+                ticket = tail_buffer.ticket()
+                tail = await read_messages(conv_uuid, tail_buffer.capacity)
+                tail_buffer.load(conv_uuid, tail, ticket)
+                rows = tail[:fetch]
+        else:
+            rows = await read_messages(conv_uuid, fetch)
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['message_id'])
+        return rows, next_cursor
+    
+    @staticmethod
+    async def get_conversation_messages(conversation_id: int,
+                                        page: int = 1,
+                                        limit: int = 20,
+                                        cursor: Optional[str] = None,
+                                        include_total: bool = True) -> Dict[str, Any]:
+        """
+        Get messages for a conversation, newest first, with cursor pagination.
+        
+        page is kept for compatibility and only echoed back; pass the returned
+        next_cursor to fetch the following page. total comes from the
+        maintained message counter, or is None when include_total is False.
+        """
+        try:
+            conv_uuid = await resolve_conversation_uuid(conversation_id)
+            if not conv_uuid:
+                return {
+                    'total': 0,
+                    'page': page,
+                    'limit': limit,
+                    'next_cursor': None,
+                    'data': []
+                }
             
-            messages = []
-            for row in message_rows:
-                sender_id_str = str(row['sender_id'])
-                sender_id_int = uuid_to_int(row['sender_id'])
-                receiver_id = 2 if sender_id_int % 2 == 1 else 1 
-                
-                messages.append({
-                    'id': row['message_id'],
-                    'conversation_id': row['conversation_id'],
-                    'sender_id': sender_id_int,
-                    'receiver_id': receiver_id,
-                    'content': row['content'],
-                    'created_at': row['created_at']
-                })
+            total_count, (message_rows, next_cursor) = await asyncio.gather(
+                read_counter(MESSAGE_COUNT_SELECT, conv_uuid, include_total),
+                MessageModel._read_message_page(conv_uuid, limit, cursor=cursor),
+            )
             return {
                 'total': total_count,
                 'page': page,
                 'limit': limit,
-                'data': messages
+                'next_cursor': next_cursor,
+                'data': message_records(message_rows)
             }
         except Exception as e:
             print(f"Error in get_conversation_messages: {str(e)}")
@@ -131,59 +818,114 @@ class MessageModel:
     async def get_messages_before_timestamp(conversation_id: int, 
                                      before_timestamp: datetime,
                                      page: int = 1, 
-                                     limit: int = 20) -> Dict[str, Any]:
+                                     limit: int = 20,
+                                     cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        Get messages before a timestamp with pagination.
-        Students should decide how to implement filtering by timestamp with pagination.
+        Get messages before a timestamp, newest first, with cursor pagination.
+        
+        When a cursor is given it takes precedence over before_timestamp, since
+        it already points below the timestamp the first page was read with.
         """
         try:
-            try:
-                all_convs_query = "SELECT conversation_id FROM conversation_participants"
-                all_convs = cassandra_client.execute(all_convs_query)
-                
-                uuid_to_int = lambda uuid_obj: int(str(uuid_obj).replace('-', '')[:10], 16)
-                conv_uuid = None
-                for row in all_convs:
-                    conv_id = row['conversation_id']
-                    if uuid_to_int(conv_id) == conversation_id:
-                        conv_uuid = conv_id
-                        break
-                if not conv_uuid:
-                    return {
-                        'total': 0,
-                        'page': page,
-                        'limit': limit,
-                        'data': []
-                    }
-            except Exception as e:
-                print(f"Error finding conversation: {str(e)}")
-                namespace = uuid.NAMESPACE_OID
-                conv_uuid = uuid.uuid5(namespace, f"conversation-{conversation_id}")
+            conv_uuid = await resolve_conversation_uuid(conversation_id)
+            if not conv_uuid:
+                return {
+                    'total': 0,
+                    'page': page,
+                    'limit': limit,
+                    'next_cursor': None,
+                    'data': []
+                }
             
-            timestamp_str = before_timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-            messages_query = f"SELECT * FROM messages WHERE conversation_id = {conv_uuid} AND created_at < '{timestamp_str}' LIMIT {limit}"
-            message_rows = cassandra_client.execute(messages_query)
-            messages = []
-            for row in message_rows:
-                sender_id_int = uuid_to_int(row['sender_id'])
-                receiver_id = 2 if sender_id_int % 2 == 1 else 1  
-                messages.append({
-                    'id': row['message_id'],
-                    'conversation_id': row['conversation_id'],
-                    'sender_id': sender_id_int,
-                    'receiver_id': receiver_id,
-                    'content': row['content'],
-                    'created_at': row['created_at']
-                })
+            message_rows, next_cursor = await MessageModel._read_message_page(
+                conv_uuid, limit, cursor=cursor, before_timestamp=before_timestamp
+            )
+            messages = message_records(message_rows)
             return {
                 'total': len(messages),  
                 'page': page,
                 'limit': limit,
+                'next_cursor': next_cursor,
                 'data': messages
             }
         except Exception as e:
             print(f"Error in get_messages_before_timestamp: {str(e)}")
             raise
+    
+    @staticmethod
+    async def get_messages_after(conversation_id: int,
+                                 after_timestamp: Optional[datetime] = None,
+                                 cursor: Optional[str] = None,
+                                 limit: int = 20) -> Dict[str, Any]:
+        """
+        Get messages newer than a timestamp or cursor, oldest first.
+        
+        Meant for catching up after being offline: only rows past the
+        client's position are read, with clustering range reads in ascending
+        order. A cursor takes precedence over after_timestamp. next_cursor
+        always marks the position reached, so the next sync resumes exactly
+        there even when nothing new arrived.
+        """
+        try:
+            empty = {
+                'conversation_id': conversation_id,
+                'limit': limit,
+                'has_more': False,
+                'next_cursor': cursor,
+                'data': []
+            }
+            after_key = decode_cursor(cursor) if cursor else None
+            if after_key is None and after_timestamp is not None:
+                # Nothing at the timestamp itself comes after the nil UUID, so
+                # this cursor marks the same position
+                empty['next_cursor'] = encode_cursor(after_timestamp, uuid.UUID(int=0))
+            
+            conv_uuid = await resolve_conversation_uuid(conversation_id)
+            if not conv_uuid:
+                return empty
+            
+            # One extra row tells us whether more follow
+            rows = await read_messages_after(
+                conv_uuid, limit + 1,
+                after=None if after_key else after_timestamp,
+                after_key=after_key
+            )
+            if not rows:
+                return empty
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            return {
+                'conversation_id': conversation_id,
+                'limit': limit,
+                'has_more': has_more,
+                'next_cursor': encode_cursor(rows[-1]['created_at'], rows[-1]['message_id']),
+                'data': message_records(rows)
+            }
+        except Exception as e:
+            logger.warning(f"Error in get_messages_after: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def sync_conversations(positions: List[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Catch up on several conversations at once, e.g. a whole inbox after reconnecting.
+        
+        Args:
+            positions: Items with conversation_id and optionally after_timestamp or cursor
+            limit: Maximum number of messages per conversation
+        
+        Returns:
+            The get_messages_after result of each item, read concurrently
+        """
+        return list(await asyncio.gather(*(
+            MessageModel.get_messages_after(
+                position['conversation_id'],
+                after_timestamp=position.get('after_timestamp'),
+                cursor=position.get('cursor'),
+                limit=limit
+            )
+            for position in positions
+        )))
 class ConversationModel:
     """
     Conversation model for interacting with the conversations-related tables.
@@ -196,25 +938,45 @@ class ConversationModel:
     """
     
     @staticmethod
-    async def get_user_conversations(user_id: int, page: int = 1, limit: int = 20) -> Dict[str, Any]:
+    async def get_user_conversations(user_id: int,
+                                     page: int = 1,
+                                     limit: int = 20,
+                                     include_total: bool = True) -> Dict[str, Any]:
         """
         Get conversations for a user with pagination.
-        Students should decide what parameters are needed and how to implement pagination.
+        
+        Pages are served from the inbox cache when possible. total comes from
+        the maintained per-user conversation counter, or is None when
+        include_total is False.
         """
         try:
-            user_id_str = f"user-{user_id}"
-            namespace = uuid.NAMESPACE_OID
-            user_uuid = uuid.uuid5(namespace, user_id_str)
-            uuid_to_int = lambda uuid_obj: int(str(uuid_obj).replace('-', '')[:10], 16)
-            count_query = f"SELECT COUNT(*) as count FROM conversations WHERE user_id = {user_uuid}"
-            count_result = cassandra_client.execute(count_query)
-            total_count = count_result[0]['count'] if count_result and count_result[0]['count'] else 0
-            offset = (page - 1) * limit
-            total_pages = math.ceil(total_count / limit) if total_count > 0 else 1
-            query = f"SELECT * FROM conversations WHERE user_id = {user_uuid} LIMIT {limit}"
-            result = cassandra_client.execute(query)
+            cache_key = (user_id, page, limit, include_total)
+            cached = inbox_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            ticket = inbox_cache.ticket()
+            
+            owner_uuid = user_uuid(user_id)
+            fetch = page * limit
+            total_count, result = await asyncio.gather(
+                read_counter(CONVERSATION_COUNT_SELECT, owner_uuid, include_total),
+                storage.aexecute(INBOX_SELECT, (owner_uuid, fetch), profile=PROFILE_READ),
+            )
+            # Rows left behind by concurrent sends or written before inbox_index
+            # existed are skipped; scripts/dedupe_inbox.py removes them for good
+            while True:
+                seen = set()
+                unique = []
+                for row in result:
+                    if row['conversation_id'] not in seen:
+                        seen.add(row['conversation_id'])
+                        unique.append(row)
+                if len(unique) >= page * limit or len(result) < fetch:
+                    break
+                fetch *= 2
+                result = await storage.aexecute(INBOX_SELECT, (owner_uuid, fetch), profile=PROFILE_READ)
             conversations = []
-            for row in result:
+            for row in unique[(page - 1) * limit:page * limit]:
                 other_user_id_int = uuid_to_int(row['other_user_id'])
                 conversations.append({
                     'id': uuid_to_int(row['conversation_id']),
@@ -224,12 +986,14 @@ class ConversationModel:
                     'last_message_content': row['last_message_content']
                 })
             
-            return {
+            result = {
                 'total': total_count,
                 'page': page,
                 'limit': limit,
                 'data': conversations
             }
+            inbox_cache.put(cache_key, result, ticket)
+            return result
         except Exception as e:
             print(f"Error in get_user_conversations: {str(e)}")
             raise
@@ -241,22 +1005,24 @@ class ConversationModel:
         Students should decide what parameters are needed and what data to return.
         """
         try:
-            uuid_to_int = lambda uuid_obj: int(str(uuid_obj).replace('-', '')[:10], 16)
-            namespace = uuid.NAMESPACE_OID
-            conv_uuid = uuid.uuid5(namespace, f"conversation-{conversation_id}")
-            participants_query = f"SELECT user_id FROM conversation_participants WHERE conversation_id = {conv_uuid} LIMIT 2"
-            participants = cassandra_client.execute(participants_query)
+            conv_uuid = await resolve_conversation_uuid(conversation_id)
+            if not conv_uuid:
+                return None
+            # conversations is partitioned by user, so read the latest message from
+            # the conversation's own messages instead
+            participants, message_info = await asyncio.gather(
+                storage.aexecute(PARTICIPANTS_SELECT, (conv_uuid,), profile=PROFILE_READ),
+                read_messages(conv_uuid, 1),
+            )
             if not participants or len(participants) < 2:
                 return None
             participant_ids = [uuid_to_int(row['user_id']) for row in participants]
             user1_id, user2_id = participant_ids[0], participant_ids[1]
-            message_query = f"SELECT last_message_at, last_message_content FROM conversations WHERE conversation_id = {conv_uuid} LIMIT 1"
-            message_info = cassandra_client.execute(message_query)
             last_message_at = None
             last_message_content = None
             if message_info and len(message_info) > 0:
-                last_message_at = message_info[0]['last_message_at']
-                last_message_content = message_info[0]['last_message_content']
+                last_message_at = message_info[0]['created_at']
+                last_message_content = message_info[0]['content']
             return {
                 'id': conversation_id,
                 'user1_id': user1_id,
@@ -267,32 +1033,26 @@ class ConversationModel:
         except Exception as e:
             print(f"Error in get_conversation: {str(e)}")
             raise 
-
+    
     @staticmethod
     async def create_or_get_conversation(user1_id: uuid.UUID, user2_id: uuid.UUID) -> Dict[str, Any]:
         """
-        Get an existing conversation between two users or create a new one.
-        Students should decide how to handle this operation efficiently.
-        """
-        query = """
-        SELECT conversation_id FROM conversation_participants 
-        WHERE user_id = ?
+        Get the conversation between two users, creating it if needed.
+        
+        The conversation ID is derived from the user pair, so finding it needs
+        no search: one single-partition read tells whether it already exists.
         """
-        user1_convs = cassandra_client.execute(query, (user1_id,))
-        for row in user1_convs:
-            conv_id = row['conversation_id']
-            query = """
-            SELECT conversation_id FROM conversation_participants 
-            WHERE conversation_id = ? AND user_id = ?
-            """
-            matches = cassandra_client.execute(query, (conv_id, user2_id))
-            if matches:
-                return {'conversation_id': conv_id, 'user1_id': user1_id, 'user2_id': user2_id}
-        conversation_id = uuid.uuid4()
-        for user_id in [user1_id, user2_id]:
-            query = """
-            INSERT INTO conversation_participants (conversation_id, user_id)
-            VALUES (?, ?)
-            """
-            cassandra_client.execute(query, (conversation_id, user_id))
-        return {'conversation_id': conversation_id, 'user1_id': user1_id, 'user2_id': user2_id}
\ No newline at end of file
+        conversation_id = conversation_uuid_for(user1_id, user2_id)
+        result = {'conversation_id': conversation_id, 'user1_id': user1_id, 'user2_id': user2_id}
+        participants = await storage.aexecute(PARTICIPANTS_SELECT, (conversation_id,))
+        if participants:
+            return {**result, 'created': False}
+        
+        _, created = await asyncio.gather(
+            storage.aexecute_batch([
+                (PARTICIPANT_INSERT, (conversation_id, user1_id)),
+                (PARTICIPANT_INSERT, (conversation_id, user2_id)),
+            ], profile=PROFILE_WRITE),
+            register_conversation(conversation_id, user1_id, user2_id),
+        )
+        return {**result, 'created': created}
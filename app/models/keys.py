@@ -0,0 +1,31 @@
+"""
+Derivation of the Cassandra keys behind the integer IDs used by the API.
+
+Kept free of database imports so scripts can share it with the models.
+"""
+import uuid
+
+
+def user_uuid(user_id: int) -> uuid.UUID:
+    """Derive the UUID a user's rows are stored under."""
+    return uuid.uuid5(uuid.NAMESPACE_OID, f"user-{user_id}")
+
+
+def uuid_to_int(uuid_obj: uuid.UUID) -> int:
+    """
+    Derive the public integer ID the API exposes for a UUID.
+    
+    The ID is the UUID's top 40 bits, i.e. its first 10 hex digits.
+    """
+    return uuid_obj.int >> 88
+
+
+def conversation_uuid_for(user1_uuid: uuid.UUID, user2_uuid: uuid.UUID) -> uuid.UUID:
+    """
+    Derive the conversation UUID for a pair of users.
+    
+    The pair is sorted first, so both users map to the same conversation
+    whoever sends first.
+    """
+    low, high = sorted((str(user1_uuid), str(user2_uuid)))
+    return uuid.uuid5(uuid.NAMESPACE_OID, f"conversation-{low}-{high}")
@@ -0,0 +1,53 @@
+"""
+Opaque cursors for keyset pagination over clustered Cassandra partitions.
+
+A cursor encodes the clustering key of the last row returned, so the next page
+starts right after it no matter how deep into the partition it is.
+"""
+import base64
+import os
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+_CURSOR_FORMAT = struct.Struct(">q16s")
+
+# Largest page a client may request from any paginated endpoint
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+# Deepest page of the offset-paginated inbox. Each page reads every row before
+# it, so a request reads at most MAX_PAGE_NUMBER pages of MAX_PAGE_SIZE rows.
+MAX_PAGE_NUMBER = MAX_PAGE_SIZE
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded."""
+
+
+def _to_millis(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+
+def encode_cursor(created_at: datetime, message_id: uuid.UUID) -> str:
+    """Encode a (created_at, message_id) clustering key as an opaque cursor."""
+    raw = _CURSOR_FORMAT.pack(_to_millis(created_at), message_id.bytes)
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """
+    Decode a cursor produced by encode_cursor.
+    
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        millis, message_bytes = _CURSOR_FORMAT.unpack(raw)
+    except (ValueError, struct.error) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+    return _EPOCH + timedelta(milliseconds=millis), uuid.UUID(bytes=message_bytes)
@@ -0,0 +1,44 @@
+"""
+Compact records returned by the models for list endpoints.
+
+Records are built in a single pass over the storage rows and already carry
+the public integer IDs, so controllers hand them to the response encoder as
+they are. Fields are declared in the order of the matching response schema,
+which is the order they are encoded in.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, List, Mapping
+
+
+@dataclass(slots=True)
+class MessageRecord:
+    """A message as returned by the API, see app.schemas.message.MessageResponse."""
+    content: str
+    id: int
+    sender_id: int
+    receiver_id: int
+    created_at: datetime
+    conversation_id: int
+
+
+def message_records(rows: Iterable[Mapping[str, Any]]) -> List[MessageRecord]:
+    """
+    Decode messages table rows into records.
+    
+    IDs are the top 40 bits of the UUIDs, as in app.models.keys.uuid_to_int,
+    computed inline since this runs for every row of every page.
+    """
+    records = []
+    for row in rows:
+        sender_id = row['sender_id'].int >> 88
+        records.append(MessageRecord(
+            row['content'],
+            row['message_id'].int >> 88,
+            sender_id,
+            # The schema does not store the receiver
+            2 if sender_id % 2 == 1 else 1,
+            row['created_at'],
+            row['conversation_id'].int >> 88
+        ))
+    return records
@@ -0,0 +1,144 @@
+"""
+Write-behind queue that coalesces pending writes per key.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingWriteQueue:
+    """
+    Buffers writes for a short window and flushes them together.
+    
+    A write to a key that is already pending replaces it when its version is
+    not older, so a burst of updates to one key costs a single write. A single
+    flush task runs at a time, which keeps the writes of a key in version
+    order. Once max_pending keys are waiting, writes to further keys wait for
+    that task, so a burst slows its writers down instead of growing the queue
+    and the number of tasks. Instances are meant to be used from the event
+    loop thread only.
+    """
+    
+    def __init__(self,
+                 flush: Callable[[List[Any]], Awaitable[List[Optional[BaseException]]]],
+                 window: float,
+                 max_pending: int,
+                 max_attempts: int = 3):
+        """
+        Args:
+            flush: Writes the given values, returning None or the error for each
+            window: Seconds a write may wait for others to merge with
+            max_pending: Pending keys that trigger a flush before the window
+                ends, and beyond which writes to new keys wait for it
+            max_attempts: Flushes a value may fail before it is dropped
+        """
+        self._flush_values = flush
+        self.window = window
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        # key -> (version, value, failed attempts)
+        self._pending: Dict[Hashable, Tuple[Any, Any, int]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.merged = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+        self.dropped = 0
+    
+    async def put(self, key: Hashable, value: Any, version: Any) -> None:
+        """
+        Queue a write, merging it with a pending write to the same key.
+        
+        Waits for the running flush while the queue is full and key is not
+        already pending.
+        """
+        while key not in self._pending and len(self._pending) >= self.max_pending:
+            # wait() neither raises the flush's errors nor cancels it with the writer
+            await asyncio.wait([self._start_flush()])
+        self.enqueued += 1
+        self._merge(key, value, version, 0)
+        if len(self._pending) >= self.max_pending:
+            self._start_flush()
+        elif self._timer is None and self._flush_task is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._start_flush)
+    
+    def _merge(self, key: Hashable, value: Any, version: Any, attempts: int) -> None:
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.merged += 1
+            if version < pending[0]:
+                return
+        self._pending[key] = (version, value, attempts)
+    
+    def _start_flush(self) -> asyncio.Task:
+        """Start a flush unless one is running, and return the running flush."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self.flush())
+            self._flush_task.add_done_callback(self._flush_done)
+        return self._flush_task
+    
+    def _flush_done(self, task: asyncio.Task) -> None:
+        if self._flush_task is task:
+            self._flush_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Write-behind flush failed: {str(task.exception())}")
+        if len(self._pending) >= self.max_pending:
+            self._start_flush()
+        elif self._pending and self._timer is None:
+            # Writes queued during the flush wait for the next window
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._start_flush)
+    
+    async def flush(self) -> None:
+        """Write everything pending now; failed values are queued again."""
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            items = list(batch.items())
+            try:
+                errors = await self._flush_values([value for _, (_, value, _) in items])
+            except Exception as e:
+                errors = [e] * len(items)
+            self.flushes += 1
+            for (key, (version, value, attempts)), error in zip(items, errors):
+                if error is None:
+                    self.written += 1
+                    continue
+                self.failed += 1
+                if attempts + 1 >= self.max_attempts:
+                    self.dropped += 1
+                    logger.error(f"Dropping write-behind update for {key} after {attempts + 1} attempts: {str(error)}")
+                else:
+                    self._merge(key, value, version, attempts + 1)
+    
+    async def drain(self) -> None:
+        """Flush until nothing is pending, e.g. on shutdown."""
+        while self._pending or self._flush_task is not None:
+            await asyncio.gather(self._start_flush(), return_exceptions=True)
+    
+    def depth(self) -> int:
+        """Number of keys waiting to be written."""
+        return len(self._pending)
+    
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and counts of enqueued, merged, written and failed updates."""
+        return {
+            'depth': len(self._pending),
+            'enqueued': self.enqueued,
+            'merged': self.merged,
+            'written': self.written,
+            'flushes': self.flushes,
+            'failed': self.failed,
+            'dropped': self.dropped,
+        }
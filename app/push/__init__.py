@@ -0,0 +1 @@
+from app.push.hub import MessageHub, Subscription
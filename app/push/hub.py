@@ -0,0 +1,152 @@
+"""
+In-process publish/subscribe hub delivering new messages to open connections.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Optional
+
+Event = Dict[str, Any]
+
+# What happens to a subscriber whose queue is full
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+
+
+class Subscription:
+    """
+    One connection's bounded queue of events.
+    
+    Read with `get`; once it returns None the subscription has been closed,
+    and the client should reconnect and catch up over the REST endpoints.
+    """
+    
+    def __init__(self, user_id: Hashable, max_queue: int):
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.closed = False
+        # Set when events were dropped since the last one was read
+        self.lagged = False
+        self._events: Deque[Event] = deque()
+        self._ready = asyncio.Event()
+    
+    def _push(self, event: Event) -> None:
+        self._events.append(event)
+        self._ready.set()
+    
+    def _close(self) -> None:
+        self.closed = True
+        self._events.clear()
+        self._ready.set()
+    
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        Wait for the next event.
+        
+        Raises:
+            asyncio.TimeoutError: If no event arrived within timeout seconds
+        """
+        while not self._events:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        return self._events.popleft()
+    
+    def pending(self) -> int:
+        """Number of events waiting to be read."""
+        return len(self._events)
+
+
+class MessageHub:
+    """
+    Fans events out to every subscription of a user.
+    
+    Publishing never waits: each subscription has a queue of at most
+    `max_queue` events, and a subscriber that falls behind is handled by
+    `slow_consumer`. With "drop_oldest" its oldest events are discarded and
+    the subscription is marked lagged; with "disconnect" it is closed. Either
+    way the client knows to resync rather than silently missing messages.
+    Only connections held by this process are reached.
+    
+    Instances are meant to be used from the event loop thread only.
+    """
+    
+    def __init__(self, max_queue: int, slow_consumer: str = "disconnect", max_subscriptions_per_user: int = 16):
+        if slow_consumer not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy '{slow_consumer}', expected one of {', '.join(SLOW_CONSUMER_POLICIES)}")
+        self.max_queue = max_queue
+        self.slow_consumer = slow_consumer
+        self.max_subscriptions_per_user = max_subscriptions_per_user
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.disconnected = 0
+        # user -> subscriptions in the order they were opened
+        self._subscriptions: Dict[Hashable, Dict[Subscription, None]] = {}
+    
+    def subscribe(self, user_id: Hashable) -> Subscription:
+        """
+        Open a subscription to a user's events.
+        
+        When the user already has max_subscriptions_per_user, the oldest one
+        is closed to make room.
+        """
+        subscriptions = self._subscriptions.get(user_id, {})
+        if len(subscriptions) >= self.max_subscriptions_per_user:
+            self.unsubscribe(next(iter(subscriptions)))
+        subscription = Subscription(user_id, self.max_queue)
+        self._subscriptions.setdefault(user_id, {})[subscription] = None
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Close a subscription and stop delivering to it."""
+        subscription._close()
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.pop(subscription, None)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+    
+    def publish(self, user_id: Hashable, event: Event) -> int:
+        """
+        Deliver an event to every subscription of a user.
+        
+        Returns:
+            The number of subscriptions the event was queued for
+        """
+        self.published += 1
+        delivered = 0
+        for subscription in list(self._subscriptions.get(user_id, ())):
+            if subscription.pending() >= self.max_queue:
+                if self.slow_consumer == "disconnect":
+                    # Its queued events and this one are lost with it
+                    subscription.dropped += subscription.pending() + 1
+                    self.dropped += subscription.pending() + 1
+                    self.disconnected += 1
+                    self.unsubscribe(subscription)
+                    continue
+                subscription._events.popleft()
+                subscription.dropped += 1
+                subscription.lagged = True
+                self.dropped += 1
+            subscription._push(event)
+            delivered += 1
+        self.delivered += delivered
+        return delivered
+    
+    def close(self) -> None:
+        """Close every subscription, e.g. on shutdown."""
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                self.unsubscribe(subscription)
+    
+    def stats(self) -> Dict[str, int]:
+        """Open subscriptions and counts of published, delivered and dropped events."""
+        return {
+            'users': len(self._subscriptions),
+            'subscriptions': sum(len(subscriptions) for subscriptions in self._subscriptions.values()),
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'disconnected': self.disconnected,
+        }
@@ -18,7 +18,7 @@ class PaginatedConversationRequest(BaseModel):
     limit: int = Field(20, description="Number of items per page")
 
 class PaginatedConversationResponse(BaseModel):
-    total: int = Field(..., description="Total number of conversations")
+    total: Optional[int] = Field(None, description="Total number of conversations, null when include_total is false")
     page: int = Field(..., description="Current page number")
     limit: int = Field(..., description="Number of items per page")
     data: List[ConversationResponse] = Field(..., description="List of conversations") 
\ No newline at end of file
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from datetime import datetime
 
+from app.models.pagination import MAX_PAGE_SIZE
+
 class MessageBase(BaseModel):
     content: str = Field(..., description="Content of the message")
 
@@ -10,6 +12,9 @@ class MessageCreate(MessageBase):
     receiver_id: int = Field(..., description="ID of the receiver")
 
 class MessageResponse(MessageBase):
+    # The models return app.models.records.MessageRecord objects
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int = Field(..., description="Unique ID of the message")
     sender_id: int = Field(..., description="ID of the sender")
     receiver_id: int = Field(..., description="ID of the receiver")
@@ -20,9 +25,42 @@ class PaginatedMessageRequest(BaseModel):
     page: int = Field(1, description="Page number for pagination")
     limit: int = Field(20, description="Number of items per page")
     before_timestamp: Optional[datetime] = Field(None, description="Get messages before this timestamp")
+    cursor: Optional[str] = Field(None, description="Cursor returned by the previous page")
 
 class PaginatedMessageResponse(BaseModel):
-    total: int = Field(..., description="Total number of messages")
+    total: Optional[int] = Field(None, description="Total number of messages, null when include_total is false")
     page: int = Field(..., description="Current page number")
     limit: int = Field(..., description="Number of items per page")
-    data: List[MessageResponse] = Field(..., description="List of messages") 
\ No newline at end of file
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page")
+    data: List[MessageResponse] = Field(..., description="List of messages") 
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageCreate] = Field(..., min_length=1, max_length=1000, description="Messages to send, at most 1000")
+
+class MessageBatchResult(BaseModel):
+    index: int = Field(..., description="Position of the message in the request")
+    message: Optional[MessageResponse] = Field(None, description="The created message, if it was sent")
+    error: Optional[str] = Field(None, description="Why the message could not be sent")
+
+class MessageBatchResponse(BaseModel):
+    succeeded: int = Field(..., description="Number of messages sent")
+    failed: int = Field(..., description="Number of messages that could not be sent")
+    results: List[MessageBatchResult] = Field(..., description="Per-message results, in request order")
+
+class MessageSyncResponse(BaseModel):
+    conversation_id: int = Field(..., description="ID of the conversation")
+    limit: int = Field(..., description="Maximum number of messages returned")
+    has_more: bool = Field(..., description="Whether newer messages remain; fetch them with next_cursor")
+    next_cursor: Optional[str] = Field(None, description="Position after the last message returned, to resume the sync from")
+    data: List[MessageResponse] = Field(..., description="Messages newer than the given position, oldest first")
+
+class ConversationSyncPosition(BaseModel):
+    conversation_id: int = Field(..., description="ID of the conversation")
+    after_timestamp: Optional[datetime] = Field(None, description="Get messages after this timestamp")
+    cursor: Optional[str] = Field(None, description="next_cursor of the previous sync, takes precedence over after_timestamp")
+
+class MessageSyncRequest(BaseModel):
+    conversations: List[ConversationSyncPosition] = Field(..., min_length=1, max_length=100, description="Conversations to catch up on, at most 100")
+    limit: int = Field(20, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of messages per conversation")
+
+class MessageSyncBatchResponse(BaseModel):
+    results: List[MessageSyncResponse] = Field(..., description="Per-conversation results, in request order")
@@ -0,0 +1,405 @@
+"""
+Benchmark the Messenger API endpoints under a mixed workload.
+
+Drives the FastAPI app from app/main.py in process through httpx's ASGI
+transport, on either the Cassandra or the in-memory backend, and reports
+throughput, p50/p95/p99 latency and database calls per request for each
+operation. Results are written as JSON so runs can be compared with
+benchmarks/compare.py.
+
+Example:
+    python benchmarks/bench_api.py --backend memory --requests 20000 --concurrency 64
+    python benchmarks/bench_api.py --backend cassandra --duration 60 --mix send=1,history=4
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import platform
+import random
+import argparse
+import subprocess
+import contextvars
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+# httpx logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+OPERATIONS = ("send", "inbox", "history", "before")
+DEFAULT_MIX = "send=1,inbox=3,history=4,before=2"
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SEED_BATCH_SIZE = 1000  # Largest batch /api/messages/batch accepts
+
+# Database calls made on behalf of the request being timed. The counter is a
+# list so tasks spawned by the models, which copy the context, share it.
+db_calls: contextvars.ContextVar = contextvars.ContextVar("db_calls", default=None)
+
+def parse_args(argv=None):
+    """Parse the benchmark's command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the Messenger API endpoints")
+    parser.add_argument("--backend", choices=("memory", "cassandra"), default="memory",
+                        help="Storage backend to run the app on")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="Relative weights of send, inbox, history and before operations")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="Requests in flight")
+    parser.add_argument("--requests", type=int, default=10000,
+                        help="Requests to time, ignored when --duration is set")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Seconds to run instead of a fixed number of requests")
+    parser.add_argument("--warmup", type=int, default=500,
+                        help="Untimed requests sent before measuring")
+    parser.add_argument("--users", type=int, default=200,
+                        help="Users taking part in seeded conversations")
+    parser.add_argument("--conversations", type=int, default=1000,
+                        help="Conversations to seed")
+    parser.add_argument("--messages", type=int, default=50,
+                        help="Messages seeded per conversation")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="Page size of read operations")
+    parser.add_argument("--no-seed", action="store_true",
+                        help="Use existing data, e.g. from scripts/generate_test_data.py")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed for the workload")
+    parser.add_argument("--output", default=RESULTS_DIR,
+                        help="Directory the JSON results are written to")
+    parser.add_argument("--label", default=None,
+                        help="Name recorded with the results and used in the file name")
+    args = parser.parse_args(argv)
+    args.weights = parse_mix(parser, args.mix)
+    return args
+
+def parse_mix(parser, mix: str) -> Dict[str, float]:
+    """Parse 'name=weight,...' into operation weights."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            parser.error(f"Unknown operation '{name}', expected one of {', '.join(OPERATIONS)}")
+        try:
+            weights[name] = float(weight or 1)
+        except ValueError:
+            parser.error(f"Invalid weight for '{name}': {weight}")
+    if not any(weights.values()):
+        parser.error("At least one operation needs a positive weight")
+    return weights
+
+def load_app(backend: str):
+    """Import the app on the selected storage backend, counting its queries."""
+    os.environ["STORAGE_BACKEND"] = backend
+    from app.main import app
+    from app.db.backend import get_backend
+    
+    storage = get_backend()
+    storage.get_session()
+    count_db_calls(storage)
+    return app
+
+def count_db_calls(client) -> None:
+    """
+    Wrap the client's query methods so each call counts against the current request.
+    
+    Calls a query method makes to another one (e.g. aexecute to execute)
+    are not counted again.
+    """
+    inside = contextvars.ContextVar("inside_db_call", default=False)
+    
+    def count() -> None:
+        counter = db_calls.get()
+        if counter is not None:
+            counter[0] += 1
+    
+    def counted(method):
+        def wrapper(*args, **kwargs):
+            if inside.get():
+                return method(*args, **kwargs)
+            count()
+            token = inside.set(True)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                inside.reset(token)
+        return wrapper
+    
+    def counted_async(method):
+        async def wrapper(*args, **kwargs):
+            if inside.get():
+                return await method(*args, **kwargs)
+            count()
+            token = inside.set(True)
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                inside.reset(token)
+        return wrapper
+    
+    def counted_stream(method):
+        def wrapper(*args, **kwargs):
+            if not inside.get():
+                count()
+            return method(*args, **kwargs)
+        return wrapper
+    
+    client.execute = counted(client.execute)
+    client.aexecute = counted_async(client.aexecute)
+    client.aexecute_batch = counted_async(client.aexecute_batch)
+    client.astream = counted_stream(client.astream)
+
+class Workload:
+    """Conversations known to the benchmark and the requests it can issue."""
+    
+    def __init__(self, args, rng: random.Random):
+        self.args = args
+        self.rng = rng
+        self.conversations: List[Dict[str, int]] = []
+        self.users: List[int] = []
+        self.oldest = datetime.utcnow()
+    
+    async def seed(self, client: httpx.AsyncClient) -> None:
+        """Create conversations through the batch endpoint, as clients would."""
+        rng = self.rng
+        users = max(2, self.args.users)
+        pairs = set()
+        max_pairs = users * (users - 1) // 2
+        while len(pairs) < min(self.args.conversations, max_pairs):
+            user1, user2 = rng.sample(range(1, users + 1), 2)
+            pairs.add((min(user1, user2), max(user1, user2)))
+        
+        messages = []
+        for user1, user2 in pairs:
+            for _ in range(self.args.messages):
+                sender, receiver = (user1, user2) if rng.random() < 0.5 else (user2, user1)
+                messages.append({"sender_id": sender, "receiver_id": receiver, "content": self.content()})
+        rng.shuffle(messages)
+        
+        logger.info(f"Seeding {len(pairs)} conversations with {len(messages)} messages...")
+        seen = {}
+        for start in range(0, len(messages), SEED_BATCH_SIZE):
+            chunk = messages[start:start + SEED_BATCH_SIZE]
+            response = await client.post("/api/messages/batch", json={"messages": chunk})
+            response.raise_for_status()
+            for result in response.json()["results"]:
+                message = result["message"]
+                if message is None:
+                    continue
+                pair = (min(message["sender_id"], message["receiver_id"]),
+                        max(message["sender_id"], message["receiver_id"]))
+                seen[pair] = message["conversation_id"]
+        self.conversations = [
+            {"id": conversation_id, "user1": pair[0], "user2": pair[1]}
+            for pair, conversation_id in seen.items()
+        ]
+        self.users = sorted({user for pair in seen for user in pair})
+    
+    async def discover(self, client: httpx.AsyncClient) -> None:
+        """Find existing conversations through the inbox of users 1..users."""
+        for user_id in range(1, self.args.users + 1):
+            response = await client.get(
+                f"/api/conversations/user/{user_id}", params={"limit": 100, "include_total": "false"})
+            if response.status_code != 200:
+                continue
+            # The inbox reports the other participant by a derived ID, not the
+            # one messages are sent with, so sends pick a known user instead
+            for conversation in response.json()["data"]:
+                self.conversations.append({"id": conversation["id"], "user1": user_id, "user2": None})
+            self.users.append(user_id)
+        self.oldest = datetime.utcnow() - timedelta(days=30)
+    
+    def content(self) -> str:
+        return f"benchmark message {self.rng.getrandbits(32):08x}"
+    
+    def before_timestamp(self) -> str:
+        span = (datetime.utcnow() - self.oldest).total_seconds()
+        return (self.oldest + timedelta(seconds=self.rng.random() * span)).isoformat()
+    
+    async def send(self, client: httpx.AsyncClient) -> httpx.Response:
+        conversation = self.rng.choice(self.conversations)
+        sender, receiver = conversation["user1"], conversation["user2"]
+        if receiver is None:
+            receiver = self.rng.choice([user for user in self.users if user != sender] or [sender + 1])
+        if self.rng.random() < 0.5:
+            sender, receiver = receiver, sender
+        return await client.post("/api/messages/", json={
+            "sender_id": sender, "receiver_id": receiver, "content": self.content()})
+    
+    async def inbox(self, client: httpx.AsyncClient) -> httpx.Response:
+        user_id = self.rng.choice(self.users)
+        return await client.get(f"/api/conversations/user/{user_id}", params={"limit": self.args.limit})
+    
+    async def history(self, client: httpx.AsyncClient) -> httpx.Response:
+        conversation = self.rng.choice(self.conversations)
+        return await client.get(
+            f"/api/messages/conversation/{conversation['id']}", params={"limit": self.args.limit})
+    
+    async def before(self, client: httpx.AsyncClient) -> httpx.Response:
+        conversation = self.rng.choice(self.conversations)
+        return await client.get(
+            f"/api/messages/conversation/{conversation['id']}/before",
+            params={"before_timestamp": self.before_timestamp(), "limit": self.args.limit})
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(samples: List[tuple], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles and DB calls for (latency, db_calls) samples."""
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / count if count else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "db_calls_per_request": sum(calls for _, calls in samples) / count if count else 0.0,
+    }
+
+async def run_load(client: httpx.AsyncClient, workload: Workload, weights: Dict[str, float],
+                   concurrency: int, requests: Optional[int] = None,
+                   duration: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Issue weighted operations from `concurrency` workers and time each one.
+    
+    Runs until `requests` operations were issued or `duration` seconds passed.
+    """
+    names = list(weights)
+    cumulative = list(weights.values())
+    operations: Dict[str, Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]] = {
+        name: getattr(workload, name) for name in names
+    }
+    samples: Dict[str, List[tuple]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    remaining = [requests if duration is None else None]
+    deadline = time.perf_counter() + duration if duration is not None else None
+    
+    def more() -> bool:
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        if remaining[0] <= 0:
+            return False
+        remaining[0] -= 1
+        return True
+    
+    async def worker() -> None:
+        while more():
+            name = workload.rng.choices(names, cumulative)[0]
+            counter = [0]
+            token = db_calls.set(counter)
+            started = time.perf_counter()
+            try:
+                response = await operations[name](client)
+                failed = response.status_code >= 400
+            except Exception as e:
+                logger.error(f"{name} failed: {str(e)}")
+                failed = True
+            finally:
+                latency = time.perf_counter() - started
+                db_calls.reset(token)
+            if failed:
+                errors[name] += 1
+            else:
+                samples[name].append((latency, counter[0]))
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    results = {name: summarize(samples[name], errors[name], elapsed) for name in names}
+    overall = summarize([s for name in names for s in samples[name]], sum(errors.values()), elapsed)
+    return {"elapsed_s": elapsed, "overall": overall, "operations": results}
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print one line per operation plus the overall line."""
+    header = f"{'operation':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'db/req':>7}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["operations"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        latency = stats["latency_ms"]
+        print(f"{name:<10} {stats['requests']:>9} {stats['errors']:>7} {stats['throughput_rps']:>9.0f} "
+              f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f} "
+              f"{stats['db_calls_per_request']:>7.2f}")
+
+def write_report(report: Dict[str, Any], output: str, label: Optional[str]) -> str:
+    os.makedirs(output, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    name = f"{stamp}-{label or report['backend']}.json"
+    path = os.path.join(output, name)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return path
+
+async def benchmark(args) -> Dict[str, Any]:
+    """Seed or discover data, warm up, then run the timed load."""
+    app = load_app(args.backend)
+    rng = random.Random(args.seed)
+    workload = Workload(args, rng)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        if args.no_seed:
+            await workload.discover(client)
+        else:
+            await workload.seed(client)
+        if not workload.conversations:
+            raise RuntimeError("No conversations to benchmark, seed data first")
+        
+        if args.warmup:
+            logger.info(f"Warming up with {args.warmup} requests...")
+            await run_load(client, workload, args.weights, args.concurrency, requests=args.warmup)
+        
+        logger.info("Running benchmark...")
+        results = await run_load(
+            client, workload, args.weights, args.concurrency,
+            requests=args.requests, duration=args.duration
+        )
+    
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "weights")}
+    return {
+        "backend": args.backend,
+        "label": args.label,
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        **results,
+    }
+
+def main():
+    """Run the benchmark and save its results."""
+    args = parse_args()
+    report = asyncio.run(benchmark(args))
+    print_report(report)
+    path = write_report(report, args.output, args.label)
+    logger.info(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
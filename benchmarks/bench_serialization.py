@@ -0,0 +1,142 @@
+"""
+Benchmark the cost of encoding list responses, per page size.
+
+Times history and inbox pages of each size with the response fast path
+(app/api/responses.py) off and on, on the in-memory backend, one request at a
+time so the numbers reflect CPU per request. Reads of repeated pages are
+served from the app's caches, so the difference between the two modes is
+mostly validation and encoding.
+
+Example:
+    python benchmarks/bench_serialization.py --page-sizes 10,50,100,200 --requests 1000
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List
+
+import httpx
+
+from bench_api import RESULTS_DIR, SEED_BATCH_SIZE, git_revision, load_app, percentile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+MODES = ("validated", "fast")
+
+def parse_args(argv=None):
+    """Parse the benchmark's command line."""
+    parser = argparse.ArgumentParser(description="Benchmark list response encoding per page size")
+    parser.add_argument("--page-sizes", default="10,20,50,100,200",
+                        help="Comma-separated page sizes to time")
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="Timed requests per endpoint, page size and mode")
+    parser.add_argument("--warmup", type=int, default=100,
+                        help="Untimed requests before each measurement")
+    parser.add_argument("--output", default=RESULTS_DIR,
+                        help="Directory the JSON results are written to")
+    parser.add_argument("--label", default="serialization",
+                        help="Name recorded with the results and used in the file name")
+    args = parser.parse_args(argv)
+    try:
+        args.sizes = sorted({int(size) for size in args.page_sizes.split(",")})
+    except ValueError:
+        parser.error(f"Invalid page sizes: {args.page_sizes}")
+    return args
+
+async def seed(client: httpx.AsyncClient, rows: int) -> Dict[str, str]:
+    """Create one conversation and one inbox with at least `rows` entries; return their URLs."""
+    messages = [{"sender_id": 1, "receiver_id": 2, "content": f"history message {i}"} for i in range(rows)]
+    messages += [{"sender_id": 1, "receiver_id": 3 + i, "content": f"inbox message {i}"} for i in range(rows)]
+    conversation_id = None
+    for start in range(0, len(messages), SEED_BATCH_SIZE):
+        response = await client.post("/api/messages/batch", json={"messages": messages[start:start + SEED_BATCH_SIZE]})
+        response.raise_for_status()
+        if conversation_id is None:
+            conversation_id = response.json()["results"][0]["message"]["conversation_id"]
+    return {
+        "history": f"/api/messages/conversation/{conversation_id}",
+        "inbox": "/api/conversations/user/1",
+    }
+
+async def time_requests(client: httpx.AsyncClient, url: str, limit: int, count: int) -> List[float]:
+    """Latencies in milliseconds of `count` sequential requests."""
+    params = {"limit": limit, "include_total": "false"}
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.get(url, params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latencies
+
+async def benchmark(args) -> Dict[str, Any]:
+    """Seed the data, then time every endpoint, page size and mode."""
+    # Let the API serve the largest page size asked for
+    os.environ["MAX_PAGE_SIZE"] = str(max(args.sizes))
+    app = load_app("memory")
+    from app.api import responses
+    
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        urls = await seed(client, max(args.sizes))
+        for endpoint, url in urls.items():
+            for size in args.sizes:
+                row = {"endpoint": endpoint, "page_size": size}
+                bodies = {}
+                for mode in MODES:
+                    responses.FAST_RESPONSES = mode == "fast"
+                    bodies[mode] = (await client.get(url, params={"limit": size, "include_total": "false"})).content
+                    await time_requests(client, url, size, args.warmup)
+                    latencies = sorted(await time_requests(client, url, size, args.requests))
+                    row[mode] = {
+                        "mean_ms": sum(latencies) / len(latencies),
+                        "p50_ms": percentile(latencies, 0.50),
+                        "p99_ms": percentile(latencies, 0.99),
+                    }
+                if bodies["fast"] != bodies["validated"]:
+                    raise RuntimeError(f"Fast path output differs for {endpoint} pages of {size}")
+                row["speedup"] = row["validated"]["mean_ms"] / row["fast"]["mean_ms"]
+                results.append(row)
+    
+    return {
+        "label": args.label,
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "encoder": "orjson" if responses.orjson is not None else "json",
+        "config": {"page_sizes": args.sizes, "requests": args.requests, "warmup": args.warmup},
+        "results": results,
+    }
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Print one line per endpoint and page size."""
+    header = f"{'endpoint':<9} {'size':>5} {'validated ms':>13} {'fast ms':>9} {'speedup':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in report["results"]:
+        print(f"{row['endpoint']:<9} {row['page_size']:>5} {row['validated']['mean_ms']:>13.3f} "
+              f"{row['fast']['mean_ms']:>9.3f} {row['speedup']:>7.2f}x")
+
+def main():
+    """Run the benchmark and save its results."""
+    args = parse_args()
+    report = asyncio.run(benchmark(args))
+    print_report(report)
+    os.makedirs(args.output, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(args.output, f"{stamp}-{args.label}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    logger.info(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
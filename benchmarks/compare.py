@@ -0,0 +1,83 @@
+"""
+Compare two benchmark result files written by benchmarks/bench_api.py.
+
+Prints each operation's throughput, latency percentiles and DB calls per
+request side by side, and exits with status 1 when the candidate regresses
+past the thresholds, so it can gate a CI job.
+
+Example:
+    python benchmarks/compare.py benchmarks/results/baseline.json benchmarks/results/candidate.json
+"""
+import sys
+import json
+import argparse
+from typing import Any, Dict, List
+
+def parse_args(argv=None):
+    """Parse the comparison's command line."""
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", help="Results of the reference run")
+    parser.add_argument("candidate", help="Results of the run under test")
+    parser.add_argument("--max-latency-regression", type=float, default=20.0,
+                        help="Allowed p95 latency increase, in percent")
+    parser.add_argument("--max-throughput-regression", type=float, default=20.0,
+                        help="Allowed throughput decrease, in percent")
+    parser.add_argument("--max-db-call-increase", type=float, default=0.0,
+                        help="Allowed increase of DB calls per request")
+    return parser.parse_args(argv)
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+def change(old: float, new: float) -> float:
+    """Relative change in percent."""
+    if not old:
+        return 0.0 if not new else float("inf")
+    return (new - old) / old * 100
+
+def compare(baseline: Dict[str, Any], candidate: Dict[str, Any], args) -> List[str]:
+    """Print the comparison and return the regressions found."""
+    regressions = []
+    names = [name for name in baseline["operations"] if name in candidate["operations"]]
+    rows = [(name, baseline["operations"][name], candidate["operations"][name]) for name in names]
+    rows.append(("overall", baseline["overall"], candidate["overall"]))
+    
+    print(f"{'operation':<10} {'metric':<8} {'baseline':>10} {'candidate':>10} {'change':>9}")
+    for name, old, new in rows:
+        metrics = [
+            ("req/s", old["throughput_rps"], new["throughput_rps"]),
+            ("p50 ms", old["latency_ms"]["p50"], new["latency_ms"]["p50"]),
+            ("p95 ms", old["latency_ms"]["p95"], new["latency_ms"]["p95"]),
+            ("p99 ms", old["latency_ms"]["p99"], new["latency_ms"]["p99"]),
+            ("db/req", old["db_calls_per_request"], new["db_calls_per_request"]),
+        ]
+        for metric, before, after in metrics:
+            print(f"{name:<10} {metric:<8} {before:>10.2f} {after:>10.2f} {change(before, after):>+8.1f}%")
+        
+        if change(old["latency_ms"]["p95"], new["latency_ms"]["p95"]) > args.max_latency_regression:
+            regressions.append(f"{name}: p95 latency {old['latency_ms']['p95']:.2f} -> {new['latency_ms']['p95']:.2f} ms")
+        if -change(old["throughput_rps"], new["throughput_rps"]) > args.max_throughput_regression:
+            regressions.append(f"{name}: throughput {old['throughput_rps']:.0f} -> {new['throughput_rps']:.0f} req/s")
+        if new["db_calls_per_request"] - old["db_calls_per_request"] > args.max_db_call_increase:
+            regressions.append(f"{name}: DB calls per request {old['db_calls_per_request']:.2f} -> {new['db_calls_per_request']:.2f}")
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{name}: errors {old['errors']} -> {new['errors']}")
+    return regressions
+
+def main():
+    """Compare the two result files and report regressions."""
+    args = parse_args()
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    if baseline.get("config") != candidate.get("config"):
+        print("Warning: the runs used different configurations")
+    regressions = compare(baseline, candidate, args)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
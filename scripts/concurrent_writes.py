@@ -0,0 +1,43 @@
+"""
+Apply the writes produced by a table scan with bounded concurrency.
+
+Shared by the maintenance scripts that scan a table through the storage
+backend's astream and write something back for the rows they read.
+"""
+import asyncio
+from typing import Any, AsyncIterator, List, Tuple
+
+# A write is one or more (query, params) statements sharing a partition key
+Write = List[Tuple[str, Any]]
+
+async def execute_concurrently(backend, writes: AsyncIterator[Write], concurrency: int) -> AsyncIterator[Any]:
+    """
+    Apply writes with at most `concurrency` in flight, yielding each result as it completes.
+    
+    The next write is only taken from `writes` once a slot is free, so a scan
+    feeding them reads no further ahead than the writes keep up with. The
+    first failure cancels the writes still in flight and is raised.
+    
+    Args:
+        backend: Storage backend the writes are applied to, as one batch each
+        writes: Async iterator of writes
+        concurrency: Maximum writes in flight
+    
+    Yields:
+        The rows returned by each write
+    """
+    pending = set()
+    try:
+        async for statements in writes:
+            pending.add(asyncio.ensure_future(backend.aexecute_batch(statements)))
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
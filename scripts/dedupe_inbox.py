@@ -0,0 +1,88 @@
+"""
+Script to remove duplicate inbox rows from the conversations table.
+
+Before inbox_index existed every send added an inbox row, and two processes
+sending to one conversation at the same moment can still leave an extra one.
+For each user partition this keeps the newest row of every conversation,
+deletes the older ones and records the kept position in inbox_index. Run it
+once after upgrading and then periodically, e.g. from cron; running it again
+is safe, and it can run next to live traffic.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db.cassandra_client import cassandra_client
+from concurrent_writes import execute_concurrently
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCAN = "SELECT user_id, last_message_at, conversation_id, WRITETIME(last_message_content) AS written FROM conversations"
+DELETE = "DELETE FROM conversations WHERE user_id = ? AND last_message_at = ? AND conversation_id = ?"
+# The index is written at the kept row's own write time, so a send that
+# moved the row since the scan read it keeps the newer position
+INDEX = "INSERT INTO inbox_index (user_id, conversation_id, last_message_at) VALUES (?, ?, ?) USING TIMESTAMP ?"
+
+def parse_args(argv=None):
+    """Parse the job's command line."""
+    parser = argparse.ArgumentParser(description="Remove duplicate inbox rows")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="Maximum requests in flight")
+    parser.add_argument("--fetch-size", type=int, default=1000,
+                        help="Rows per page when scanning the conversations table")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only count the duplicates")
+    return parser.parse_args(argv)
+
+async def dedupe_writes(backend, args, stats):
+    """Yield the deletes of duplicate rows and the inbox_index writes of kept ones."""
+    # A full scan returns each user's partition together, newest rows first;
+    # pages are fetched only as the writes for the previous ones are issued
+    current_user, kept = None, set()
+    async for row in backend.astream(SCAN, fetch_size=args.fetch_size):
+        if row['user_id'] != current_user:
+            current_user, kept = row['user_id'], set()
+            stats["users"] += 1
+        stats["rows"] += 1
+        if row['conversation_id'] in kept:
+            stats["duplicates"] += 1
+            yield [(DELETE, (row['user_id'], row['last_message_at'], row['conversation_id']))]
+        else:
+            kept.add(row['conversation_id'])
+            if row['written'] is not None:
+                yield [(INDEX, (row['user_id'], row['conversation_id'], row['last_message_at'], row['written']))]
+
+async def dedupe_inbox(backend, args):
+    """Scan every inbox partition and remove its duplicate rows."""
+    stats = {"users": 0, "rows": 0, "duplicates": 0}
+    started = time.monotonic()
+    writes = dedupe_writes(backend, args, stats)
+    if args.dry_run:
+        async for _ in writes:
+            pass
+    else:
+        async for _ in execute_concurrently(backend, writes, args.concurrency):
+            pass
+    action = "Found" if args.dry_run else "Removed"
+    logger.info(f"{action} {stats['duplicates']} duplicate rows among {stats['rows']} rows "
+                f"of {stats['users']} users in {time.monotonic() - started:.1f}s")
+
+def main():
+    """Run the deduplication."""
+    args = parse_args()
+    try:
+        cassandra_client.connect()
+        asyncio.run(dedupe_inbox(cassandra_client, args))
+    except Exception as e:
+        logger.error(f"Error deduplicating inbox rows: {str(e)}")
+        raise
+    finally:
+        cassandra_client.close()
+
+if __name__ == "__main__":
+    main()
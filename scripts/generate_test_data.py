@@ -1,13 +1,31 @@
 """
 Script to generate test data for the Messenger application.
-This script is a skeleton for students to implement.
+
+Writes users' conversations and messages in the same shape the API writes
+them, through the driver's concurrent execution helpers, so production-sized
+data sets can be loaded locally. Messages per conversation follow a power law:
+most conversations are short and a few are very long.
+
+Example:
+    python scripts/generate_test_data.py --users 100000 --conversations 500000 \\
+        --min-messages 5 --max-messages 50000 --days 365 --concurrency 256
 """
 import os
+import sys
 import uuid
+import time
 import logging
 import random
+import argparse
+from collections import deque
 from datetime import datetime, timedelta
 from cassandra.cluster import Cluster
+from cassandra.concurrent import execute_concurrent
+from cassandra.query import BatchStatement, BatchType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models.buckets import bucket_for, bucketing_enabled
+from app.models.keys import conversation_uuid_for, user_uuid, uuid_to_int
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,11 +40,46 @@ NUM_USERS = 10  # Number of users to create
 NUM_CONVERSATIONS = 15  # Number of conversations to create
 MAX_MESSAGES_PER_CONVERSATION = 50  # Maximum number of messages per conversation
 
+# Messages per unlogged batch; each batch targets a single partition
+MESSAGES_PER_BATCH = 50
+REPORT_INTERVAL = 5.0
+
+WORDS = (
+    "hey hi hello how are you doing today tomorrow yes no maybe sure thanks "
+    "see later lunch dinner meeting call send the file link photo great cool "
+    "sounds good running late on my way what time works for you"
+).split()
+
+def parse_args(argv=None):
+    """Parse the generator's command line."""
+    parser = argparse.ArgumentParser(description="Generate Messenger test data in Cassandra")
+    parser.add_argument("--users", type=int, default=NUM_USERS,
+                        help="Number of users, with IDs 1..N")
+    parser.add_argument("--conversations", type=int, default=NUM_CONVERSATIONS,
+                        help="Number of conversations between distinct user pairs")
+    parser.add_argument("--min-messages", type=int, default=1,
+                        help="Minimum messages per conversation")
+    parser.add_argument("--max-messages", type=int, default=MAX_MESSAGES_PER_CONVERSATION,
+                        help="Maximum messages per conversation")
+    parser.add_argument("--alpha", type=float, default=1.2,
+                        help="Pareto shape of messages per conversation; lower means heavier tail")
+    parser.add_argument("--days", type=float, default=30,
+                        help="Spread message timestamps over this many days before now")
+    parser.add_argument("--concurrency", type=int, default=128,
+                        help="Maximum requests in flight")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Random seed for reproducible data")
+    args = parser.parse_args(argv)
+    max_pairs = args.users * (args.users - 1) // 2
+    if args.conversations > max_pairs:
+        parser.error(f"{args.users} users allow at most {max_pairs} conversations")
+    return args
+
 def connect_to_cassandra():
     """Connect to Cassandra cluster."""
     logger.info("Connecting to Cassandra...")
     try:
-        cluster = Cluster([CASSANDRA_HOST])
+        cluster = Cluster([CASSANDRA_HOST], port=CASSANDRA_PORT)
         session = cluster.connect(CASSANDRA_KEYSPACE)
         logger.info("Connected to Cassandra!")
         return cluster, session
@@ -34,31 +87,166 @@ def connect_to_cassandra():
         logger.error(f"Failed to connect to Cassandra: {str(e)}")
         raise
 
-def generate_test_data(session):
+def random_pairs(rng, num_users, count):
+    """Yield count distinct unordered pairs of user IDs."""
+    seen = set()
+    while len(seen) < count:
+        user1, user2 = rng.randint(1, num_users), rng.randint(1, num_users)
+        pair = (min(user1, user2), max(user1, user2))
+        if user1 != user2 and pair not in seen:
+            seen.add(pair)
+            yield pair
+
+def message_count(rng, args):
+    """Draw a power-law distributed message count for one conversation."""
+    return min(args.max_messages, int(args.min_messages * rng.paretovariate(args.alpha)))
+
+class Statements:
+    """Prepared statements matching the rows the API writes."""
+    
+    def __init__(self, session):
+        self.participant = session.prepare(
+            "INSERT INTO conversation_participants (conversation_id, user_id) VALUES (?, ?)")
+        self.message = session.prepare(
+            "INSERT INTO messages (conversation_id, message_id, sender_id, content, created_at) VALUES (?, ?, ?, ?, ?)")
+        self.inbox = session.prepare(
+            "INSERT INTO conversations (user_id, conversation_id, other_user_id, last_message_at, last_message_content) VALUES (?, ?, ?, ?, ?)")
+        self.inbox_index = session.prepare(
+            "INSERT INTO inbox_index (user_id, conversation_id, last_message_at) VALUES (?, ?, ?)")
+        self.conversation_id = session.prepare(
+            "INSERT INTO conversation_ids (id, conversation_id) VALUES (?, ?) IF NOT EXISTS")
+        self.message_count = session.prepare(
+            "UPDATE conversation_message_counts SET message_count = message_count + ? WHERE conversation_id = ?")
+        self.bucketed_message = session.prepare(
+            "INSERT INTO messages_by_bucket (conversation_id, bucket, message_id, sender_id, content, created_at) VALUES (?, ?, ?, ?, ?, ?)")
+        self.bucket = session.prepare(
+            "INSERT INTO conversation_buckets (conversation_id, bucket) VALUES (?, ?)")
+        self.conversation_count = session.prepare(
+            "UPDATE user_conversation_counts SET conversation_count = conversation_count + ? WHERE user_id = ?")
+
+def conversation_writes(rng, args, statements, user1_id, user2_id, now):
+    """
+    Yield (statement, params, rows) for one conversation.
+    
+    Messages go out in unlogged batches of one partition each; the inbox rows
+    carry the newest message, as the send path writes them. With MESSAGE_BUCKET
+    set, messages go to their bucket partitions and each bucket is recorded.
+    """
+    user1, user2 = user_uuid(user1_id), user_uuid(user2_id)
+    conversation_id = conversation_uuid_for(user1, user2)
+    count = message_count(rng, args)
+    spread = args.days * 86400
+    timestamps = sorted(
+        now - timedelta(seconds=rng.random() * spread) for _ in range(count)
+    )
+    
+    yield statements.conversation_id, (uuid_to_int(conversation_id), conversation_id), 1
+    
+    batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+    batch.add(statements.participant, (conversation_id, user1))
+    batch.add(statements.participant, (conversation_id, user2))
+    rows = 2
+    bucketed = bucketing_enabled()
+    if bucketed:
+        # Participants and bucket rows share the conversation's partition,
+        # the messages live in their own bucket partitions
+        for bucket in sorted({bucket_for(created_at) for created_at in timestamps}):
+            batch.add(statements.bucket, (conversation_id, bucket))
+            rows += 1
+        yield batch, None, rows
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        rows = 0
+    batch_bucket = None
+    content = ""
+    for created_at in timestamps:
+        # Cassandra timestamps have millisecond precision
+        created_at = created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+        sender = user1 if rng.random() < 0.5 else user2
+        if bucketed:
+            bucket = bucket_for(created_at)
+            if rows and bucket != batch_bucket:
+                yield batch, None, rows
+                batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                rows = 0
+            batch_bucket = bucket
+            batch.add(statements.bucketed_message, (conversation_id, bucket, uuid.uuid4(), sender, content, created_at))
+        else:
+            batch.add(statements.message, (conversation_id, uuid.uuid4(), sender, content, created_at))
+        rows += 1
+        if len(batch) >= MESSAGES_PER_BATCH:
+            yield batch, None, rows
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            rows = 0
+    if rows:
+        yield batch, None, rows
+    
+    last_message_at = created_at if timestamps else now
+    for user, other in ((user1, user2), (user2, user1)):
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        batch.add(statements.inbox, (user, conversation_id, other, last_message_at, content))
+        batch.add(statements.inbox_index, (user, conversation_id, last_message_at))
+        yield batch, None, 2
+    if count:
+        yield statements.message_count, (count, conversation_id), 1
+
+def generate_test_data(session, args=None):
     """
     Generate test data in Cassandra.
     
-    Students should implement this function to generate test data based on their schema design.
-    The function should create:
-    - Users (with IDs 1-NUM_USERS)
-    - Conversations between random pairs of users
-    - Messages in each conversation with realistic timestamps
+    Creates conversations between random distinct pairs of users 1..users,
+    each with a power-law number of messages spread over the last days, and
+    keeps messages, conversations, inbox_index, conversation_participants,
+    conversation_ids and the counters consistent with what the API writes. Requests are kept
+    at most `concurrency` in flight and progress is logged as rows/sec.
+    
+    Meant for an empty keyspace: running it again adds messages to pairs
+    that already exist and counts those conversations twice, which
+    scripts/rebuild_counters.py corrects.
     """
-    logger.info("Generating test data...")
+    args = args or parse_args([])
+    rng = random.Random(args.seed)
+    statements = Statements(session)
+    now = datetime.utcnow()
+    conversations_per_user = {}
+    
+    # Row counts of dispatched requests, consumed as their results come back
+    pending_rows = deque()
     
-    # TODO: Students should implement the test data generation logic
-    # Hint:
-    # 1. Create a set of user IDs
-    # 2. Create conversations between random pairs of users
-    # 3. For each conversation, generate a random number of messages
-    # 4. Update relevant tables to maintain data consistency
+    def writes():
+        for user1_id, user2_id in random_pairs(rng, args.users, args.conversations):
+            conversations_per_user[user1_id] = conversations_per_user.get(user1_id, 0) + 1
+            conversations_per_user[user2_id] = conversations_per_user.get(user2_id, 0) + 1
+            for statement, params, rows in conversation_writes(rng, args, statements, user1_id, user2_id, now):
+                pending_rows.append(rows)
+                yield statement, params
+        for user_id, count in conversations_per_user.items():
+            pending_rows.append(1)
+            yield statements.conversation_count, (count, user_uuid(user_id))
+    
+    logger.info("Generating test data...")
+    started = last_report = time.monotonic()
+    written = reported = 0
+    results = execute_concurrent(
+        session, writes(), concurrency=args.concurrency,
+        raise_on_first_error=True, results_generator=True
+    )
+    for _ in results:
+        written += pending_rows.popleft()
+        current = time.monotonic()
+        if current - last_report >= REPORT_INTERVAL:
+            logger.info(f"{written} rows written, {(written - reported) / (current - last_report):.0f} rows/sec")
+            last_report, reported = current, written
+    elapsed = time.monotonic() - started
     
-    logger.info(f"Generated {NUM_CONVERSATIONS} conversations with messages")
-    logger.info(f"User IDs range from 1 to {NUM_USERS}")
+    logger.info(f"Generated {args.conversations} conversations with messages")
+    logger.info(f"Wrote {written} rows in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} rows/sec)")
+    logger.info(f"User IDs range from 1 to {args.users}")
     logger.info("Use these IDs for testing the API endpoints")
 
 def main():
     """Main function to generate test data."""
+    args = parse_args()
     cluster = None
     
     try:
@@ -66,7 +254,7 @@ def main():
         cluster, session = connect_to_cassandra()
         
         # Generate test data
-        generate_test_data(session)
+        generate_test_data(session, args)
         
         logger.info("Test data generation completed successfully!")
     except Exception as e:
@@ -77,4 +265,4 @@ def main():
             logger.info("Cassandra connection closed")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
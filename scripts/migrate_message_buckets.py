@@ -0,0 +1,100 @@
+"""
+Script to copy messages into the time-bucketed layout.
+
+Reads every conversation's messages from the messages table and writes them
+to messages_by_bucket, recording each non-empty bucket in conversation_buckets.
+Copies are upserts, so the script can be run any number of times.
+
+Migration path:
+    1. python scripts/setup_db.py                 (creates the new tables)
+    2. python scripts/migrate_message_buckets.py --bucket month
+    3. deploy the API with MESSAGE_BUCKET=month
+    4. python scripts/migrate_message_buckets.py --bucket month
+       (copies messages written to the old table between steps 2 and 3)
+
+The old messages table can be dropped once the second run has finished.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db.cassandra_client import cassandra_client
+from app.models.buckets import MESSAGE_BUCKET, bucket_for
+from concurrent_writes import execute_concurrently
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Messages per unlogged batch; each batch targets a single bucket partition
+MESSAGES_PER_BATCH = 50
+
+SCAN = "SELECT conversation_id, created_at, message_id, sender_id, content FROM messages"
+INSERT_MESSAGE = (
+    "INSERT INTO messages_by_bucket (conversation_id, bucket, message_id, sender_id, content, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_BUCKET = "INSERT INTO conversation_buckets (conversation_id, bucket) VALUES (?, ?)"
+
+def parse_args(argv=None):
+    """Parse the migration's command line."""
+    parser = argparse.ArgumentParser(description="Copy messages into time-bucketed partitions")
+    parser.add_argument("--bucket", choices=("month", "day"),
+                        default=MESSAGE_BUCKET if MESSAGE_BUCKET != "none" else "month",
+                        help="Bucket granularity, which must match MESSAGE_BUCKET of the API")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="Maximum requests in flight")
+    parser.add_argument("--fetch-size", type=int, default=1000,
+                        help="Rows per page when reading the messages table")
+    return parser.parse_args(argv)
+
+async def migration_writes(backend, args):
+    """Yield the writes copying each conversation's messages into its buckets."""
+    # A full scan returns each partition's rows together, in clustering order;
+    # pages are fetched only as the copies of the previous ones are issued
+    batch, batch_key = None, None
+    async for row in backend.astream(SCAN, fetch_size=args.fetch_size):
+        bucket = bucket_for(row['created_at'], args.bucket)
+        key = (row['conversation_id'], bucket)
+        if key != batch_key or len(batch) >= MESSAGES_PER_BATCH:
+            if batch is not None:
+                yield batch
+            if key != batch_key:
+                yield [(INSERT_BUCKET, key)]
+            batch, batch_key = [], key
+        batch.append((INSERT_MESSAGE, (row['conversation_id'], bucket, row['message_id'],
+                                       row['sender_id'], row['content'], row['created_at'])))
+    if batch is not None:
+        yield batch
+
+async def migrate(backend, args):
+    """Copy all messages, logging progress as batches complete."""
+    started = last_report = time.monotonic()
+    statements = 0
+    results = execute_concurrently(backend, migration_writes(backend, args), args.concurrency)
+    async for _ in results:
+        statements += 1
+        current = time.monotonic()
+        if current - last_report >= 5.0:
+            logger.info(f"{statements} writes completed")
+            last_report = current
+    logger.info(f"Migrated messages into {args.bucket} buckets with {statements} writes "
+                f"in {time.monotonic() - started:.1f}s")
+
+def main():
+    """Run the migration."""
+    args = parse_args()
+    try:
+        cassandra_client.connect()
+        asyncio.run(migrate(cassandra_client, args))
+    except Exception as e:
+        logger.error(f"Error migrating messages: {str(e)}")
+        raise
+    finally:
+        cassandra_client.close()
+
+if __name__ == "__main__":
+    main()
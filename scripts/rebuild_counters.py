@@ -0,0 +1,93 @@
+"""
+Script to recompute the message and conversation counters from the base tables.
+
+Counters cannot be overwritten, so each one is moved by the difference between
+its current value and the recomputed count. Running the script again is safe.
+"""
+import os
+import sys
+import asyncio
+import logging
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db.cassandra_client import cassandra_client
+from app.models.buckets import bucketing_enabled
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows per page when scanning conversation_participants
+SCAN_FETCH_SIZE = 1000
+
+def counter_statements(table, column, key_column):
+    """The read and increment statements for one counter table."""
+    return (
+        f"SELECT {column} FROM {table} WHERE {key_column} = ?",
+        f"UPDATE {table} SET {column} = {column} + ? WHERE {key_column} = ?",
+    )
+
+async def adjust_counter(backend, statements, key, actual):
+    """Move a counter to the actual value by applying the difference."""
+    select, update = statements
+    rows = await backend.aexecute(select, (key,))
+    current = (rows[0][0] or 0) if rows else 0
+    if actual != current:
+        await backend.aexecute(update, (actual - current, key))
+
+def message_counter(backend):
+    """Return a coroutine function counting a conversation's messages in the active layout."""
+    if not bucketing_enabled():
+        async def count_messages(conversation_id):
+            rows = await backend.aexecute("SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,))
+            return rows[0][0]
+        return count_messages
+    
+    async def count_bucketed_messages(conversation_id):
+        total = 0
+        for row in await backend.aexecute("SELECT bucket FROM conversation_buckets WHERE conversation_id = ?",
+                                          (conversation_id,)):
+            rows = await backend.aexecute(
+                "SELECT COUNT(*) FROM messages_by_bucket WHERE conversation_id = ? AND bucket = ?",
+                (conversation_id, row['bucket']))
+            total += rows[0][0]
+        return total
+    return count_bucketed_messages
+
+async def rebuild_counters(backend):
+    """Recompute per-conversation message counts and per-user conversation counts."""
+    count_messages = message_counter(backend)
+    message_counts = counter_statements("conversation_message_counts", "message_count", "conversation_id")
+    conversation_counts = counter_statements("user_conversation_counts", "conversation_count", "user_id")
+    conversations_per_user = Counter()
+    conversations = 0
+    
+    last_conversation = None
+    async for row in backend.astream("SELECT conversation_id, user_id FROM conversation_participants",
+                                     fetch_size=SCAN_FETCH_SIZE):
+        conversations_per_user[row['user_id']] += 1
+        # Rows of one partition arrive together, so each conversation is seen once
+        if row['conversation_id'] != last_conversation:
+            last_conversation = row['conversation_id']
+            actual = await count_messages(row['conversation_id'])
+            await adjust_counter(backend, message_counts, row['conversation_id'], actual)
+            conversations += 1
+    
+    for user_id, actual in conversations_per_user.items():
+        await adjust_counter(backend, conversation_counts, user_id, actual)
+    
+    logger.info(f"Rebuilt counters for {conversations} conversations and {len(conversations_per_user)} users")
+
+def main():
+    """Rebuild the counters."""
+    try:
+        cassandra_client.connect()
+        asyncio.run(rebuild_counters(cassandra_client))
+    except Exception as e:
+        logger.error(f"Error rebuilding counters: {str(e)}")
+        raise
+    finally:
+        cassandra_client.close()
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import os
 import time
 import logging
 from cassandra.cluster import Cluster
+from cassandra.query import SimpleStatement
 from cassandra.auth import PlainTextAuthProvider
 
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +15,9 @@ logger = logging.getLogger(__name__)
 CASSANDRA_HOST = os.getenv("CASSANDRA_HOST", "localhost")
 CASSANDRA_PORT = int(os.getenv("CASSANDRA_PORT", "9042"))
 CASSANDRA_KEYSPACE = os.getenv("CASSANDRA_KEYSPACE", "messenger")
+# Lightweight transactions need a quorum of these replicas, so a single
+# development node needs 1
+CASSANDRA_REPLICATION_FACTOR = int(os.getenv("CASSANDRA_REPLICATION_FACTOR", "3"))
 
 def wait_for_cassandra():
     """Wait for Cassandra to be ready before proceeding."""
@@ -43,9 +47,9 @@ def create_keyspace(session):
     CREATE KEYSPACE IF NOT EXISTS %s 
     WITH replication = {
         'class': 'SimpleStrategy',
-        'replication_factor': 3
+        'replication_factor': %d
     }
-    """ % CASSANDRA_KEYSPACE)
+    """ % (CASSANDRA_KEYSPACE, CASSANDRA_REPLICATION_FACTOR))
     
     logger.info(f"Keyspace {CASSANDRA_KEYSPACE} is ready.")
 
@@ -66,6 +70,29 @@ def create_tables(session):
     ) WITH CLUSTERING ORDER BY (created_at DESC, message_id ASC)
     """ % CASSANDRA_KEYSPACE)
     
+    # Time-bucketed layout used when MESSAGE_BUCKET is "month" or "day"; the
+    # bucket bounds partition size for long-running conversations
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS %s.messages_by_bucket (
+        conversation_id UUID,
+        bucket INT,
+        message_id UUID,
+        sender_id UUID,
+        content TEXT,
+        created_at TIMESTAMP,
+        PRIMARY KEY ((conversation_id, bucket), created_at, message_id)
+    ) WITH CLUSTERING ORDER BY (created_at DESC, message_id ASC)
+    """ % CASSANDRA_KEYSPACE)
+    
+    # Non-empty buckets of each conversation, so reads skip empty ones
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS %s.conversation_buckets (
+        conversation_id UUID,
+        bucket INT,
+        PRIMARY KEY ((conversation_id), bucket)
+    ) WITH CLUSTERING ORDER BY (bucket DESC)
+    """ % CASSANDRA_KEYSPACE)
+    
     session.execute("""
     CREATE TABLE IF NOT EXISTS %s.conversations (
         user_id UUID,
@@ -77,6 +104,17 @@ def create_tables(session):
     ) WITH CLUSTERING ORDER BY (last_message_at DESC, conversation_id ASC)
     """ % CASSANDRA_KEYSPACE)
     
+    # Current last_message_at of each inbox row, so a send can delete the
+    # row it replaces instead of leaving one row per message
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS %s.inbox_index (
+        user_id UUID,
+        conversation_id UUID,
+        last_message_at TIMESTAMP,
+        PRIMARY KEY ((user_id), conversation_id)
+    )
+    """ % CASSANDRA_KEYSPACE)
+    
     session.execute("""
     CREATE TABLE IF NOT EXISTS %s.conversation_participants (
         conversation_id UUID,
@@ -85,8 +123,51 @@ def create_tables(session):
     )
     """ % CASSANDRA_KEYSPACE)
     
+    # Maps the integer conversation ID exposed by the API to the conversation UUID
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS %s.conversation_ids (
+        id BIGINT,
+        conversation_id UUID,
+        PRIMARY KEY (id)
+    )
+    """ % CASSANDRA_KEYSPACE)
+    
+    # Maintained counts, read instead of COUNT(*) by the paginated endpoints
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS %s.conversation_message_counts (
+        conversation_id UUID,
+        message_count COUNTER,
+        PRIMARY KEY (conversation_id)
+    )
+    """ % CASSANDRA_KEYSPACE)
+    
+    session.execute("""
+    CREATE TABLE IF NOT EXISTS %s.user_conversation_counts (
+        user_id UUID,
+        conversation_count COUNTER,
+        PRIMARY KEY (user_id)
+    )
+    """ % CASSANDRA_KEYSPACE)
+    
     logger.info("Tables created successfully.")
 
+def backfill_conversation_ids(session):
+    """
+    Record integer IDs for conversations created before conversation_ids existed.
+    
+    Inserts use IF NOT EXISTS, as the API does, so the first conversation
+    to register an ID keeps it and stored mappings are never overwritten.
+    """
+    logger.info("Backfilling conversation_ids...")
+    insert = session.prepare("INSERT INTO conversation_ids (id, conversation_id) VALUES (?, ?) IF NOT EXISTS")
+    count = 0
+    scan = SimpleStatement("SELECT DISTINCT conversation_id FROM conversation_participants", fetch_size=1000)
+    for row in session.execute(scan):
+        conversation_id = row.conversation_id
+        if session.execute(insert, (int(conversation_id.hex[:10], 16), conversation_id)).was_applied:
+            count += 1
+    logger.info(f"Backfilled {count} conversation IDs.")
+
 def main():
     """Initialize the database."""
     logger.info("Starting Cassandra initialization...")
@@ -102,6 +183,7 @@ def main():
         create_keyspace(session)
         session.set_keyspace(CASSANDRA_KEYSPACE)
         create_tables(session)
+        backfill_conversation_ids(session)
         
         logger.info("Cassandra initialization completed successfully.")
     except Exception as e:
@@ -0,0 +1,10 @@
+"""
+Run the tests against the in-memory storage backend with the default layout.
+
+Both are read when the app modules are first imported, so they are set here
+before any test module imports them.
+"""
+import os
+
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["MESSAGE_BUCKET"] = "none"
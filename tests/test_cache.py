@@ -0,0 +1,160 @@
+"""
+Tests of the tail buffer and the inbox page cache.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+from app.cache import InboxCache, TailBuffer
+from app.cache import inbox, tail
+
+START = datetime(2024, 1, 1)
+
+
+def message(seconds, message_id=None):
+    return {'created_at': START + timedelta(seconds=seconds), 'message_id': message_id or uuid.uuid4()}
+
+
+def newest_first(rows):
+    return sorted(rows, key=lambda row: (-row['created_at'].timestamp(), row['message_id']))
+
+
+def test_tail_miss_then_hit():
+    buffer = TailBuffer(capacity=5, max_conversations=10, ttl=60)
+    rows = newest_first([message(i) for i in range(3)])
+    assert buffer.read("c", 2) is None
+    buffer.load("c", rows, buffer.ticket())
+    assert buffer.read("c", 2) == rows[:2]
+    # The whole conversation is loaded, so longer reads are answered too
+    assert buffer.read("c", 10) == rows
+    assert buffer.stats()['hits'] == 2
+    assert buffer.stats()['misses'] == 1
+
+
+def test_tail_of_a_longer_conversation_only_answers_reads_it_holds():
+    buffer = TailBuffer(capacity=3, max_conversations=10, ttl=60)
+    rows = newest_first([message(i) for i in range(3)])
+    buffer.load("c", rows, buffer.ticket())
+    assert buffer.read("c", 3) == rows
+    assert buffer.read("c", 4) is None
+
+
+def test_tail_append_keeps_order_and_capacity():
+    buffer = TailBuffer(capacity=3, max_conversations=10, ttl=60)
+    rows = newest_first([message(i) for i in (0, 2, 4)])
+    buffer.load("c", rows, buffer.ticket())
+    newest, middle = message(5), message(3)
+    buffer.append("c", newest)
+    buffer.append("c", middle)
+    assert buffer.read("c", 3) == [newest, rows[0], middle]
+    # Rows were pushed out, so the tail no longer holds the whole conversation
+    assert buffer.read("c", 4) is None
+
+
+def test_tail_append_orders_ties_by_message_id():
+    buffer = TailBuffer(capacity=5, max_conversations=10, ttl=60)
+    low, high = sorted(uuid.uuid4() for _ in range(2))
+    buffer.load("c", [], buffer.ticket())
+    buffer.append("c", message(0, high))
+    buffer.append("c", message(0, low))
+    assert [row['message_id'] for row in buffer.read("c", 2)] == [low, high]
+
+
+def test_tail_load_racing_a_write_is_discarded():
+    buffer = TailBuffer(capacity=5, max_conversations=10, ttl=60)
+    ticket = buffer.ticket()
+    buffer.append("c", message(1))
+    buffer.load("c", [message(0)], ticket)
+    assert buffer.read("c", 1) is None
+
+
+def test_tail_discard_forgets_the_conversation():
+    buffer = TailBuffer(capacity=5, max_conversations=10, ttl=60)
+    buffer.load("c", [message(0)], buffer.ticket())
+    buffer.discard("c")
+    assert buffer.read("c", 1) is None
+
+
+def test_tail_expires_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(tail.time, "monotonic", lambda: now[0])
+    buffer = TailBuffer(capacity=5, max_conversations=10, ttl=5)
+    rows = [message(0)]
+    buffer.load("c", rows, buffer.ticket())
+    now[0] += 5
+    assert buffer.read("c", 1) == rows
+    now[0] += 0.1
+    assert buffer.read("c", 1) is None
+    assert buffer.stats()['conversations'] == 0
+
+
+def test_tail_evicts_least_recently_used_conversations():
+    buffer = TailBuffer(capacity=5, max_conversations=2, ttl=60)
+    for conversation_id in ("a", "b"):
+        buffer.load(conversation_id, [message(0)], buffer.ticket())
+    buffer.read("a", 1)
+    buffer.load("c", [message(0)], buffer.ticket())
+    assert buffer.read("b", 1) is None
+    assert buffer.read("a", 1) is not None
+    assert buffer.stats()['evictions'] == 1
+
+
+def page(*contents):
+    return {'data': [{'last_message_content': content} for content in contents]}
+
+
+def test_inbox_cache_hit_and_invalidate():
+    cache = InboxCache(max_bytes=100000, ttl=60)
+    key = (1, 1, 20, True)
+    cache.put(key, page("hello"), cache.ticket())
+    assert cache.get(key) == page("hello")
+    cache.invalidate(1)
+    assert cache.get(key) is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_inbox_cache_invalidation_is_per_user():
+    cache = InboxCache(max_bytes=100000, ttl=60)
+    cache.put((1, 1, 20, True), page("one"), cache.ticket())
+    cache.put((2, 1, 20, True), page("two"), cache.ticket())
+    cache.invalidate(1)
+    assert cache.get((1, 1, 20, True)) is None
+    assert cache.get((2, 1, 20, True)) == page("two")
+
+
+def test_inbox_page_read_before_an_invalidation_is_not_cached():
+    cache = InboxCache(max_bytes=100000, ttl=60)
+    ticket = cache.ticket()
+    cache.invalidate(1)
+    cache.put((1, 1, 20, True), page("stale"), ticket)
+    assert cache.get((1, 1, 20, True)) is None
+    # Other users' pages read under the same ticket are still cached
+    cache.put((2, 1, 20, True), page("fresh"), ticket)
+    assert cache.get((2, 1, 20, True)) == page("fresh")
+
+
+def test_inbox_forgotten_invalidations_are_conservative():
+    cache = InboxCache(max_bytes=100000, ttl=60, max_tracked_users=1)
+    ticket = cache.ticket()
+    cache.invalidate(1)
+    cache.invalidate(2)
+    cache.put((1, 1, 20, True), page("stale"), ticket)
+    assert cache.get((1, 1, 20, True)) is None
+
+
+def test_inbox_cache_expires_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(inbox.time, "monotonic", lambda: now[0])
+    cache = InboxCache(max_bytes=100000, ttl=30)
+    cache.put((1, 1, 20, True), page("hello"), cache.ticket())
+    now[0] += 31
+    assert cache.get((1, 1, 20, True)) is None
+
+
+def test_inbox_cache_evicts_to_fit_max_bytes():
+    size = inbox._estimate_size(page("x"))
+    cache = InboxCache(max_bytes=size * 2, ttl=60)
+    for user_id in (1, 2, 3):
+        cache.put((user_id, 1, 20, True), page("x"), cache.ticket())
+    assert cache.get((1, 1, 20, True)) is None
+    assert cache.get((3, 1, 20, True)) == page("x")
+    assert cache.stats()['bytes'] <= size * 2
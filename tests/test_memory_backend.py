@@ -0,0 +1,180 @@
+"""
+Tests of the in-memory storage backend's CQL subset.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.memory_backend import MemoryBackend
+
+MESSAGE_INSERT = "INSERT INTO messages (conversation_id, message_id, sender_id, content, created_at) VALUES (?, ?, ?, ?, ?)"
+START = datetime(2024, 1, 1)
+
+
+def ids(rows):
+    return [row['content'] for row in rows]
+
+
+def make_conversation(backend, times):
+    """Insert one message per offset in seconds from START, content named by insertion order."""
+    conversation_id = uuid.uuid4()
+    for i, offset in enumerate(times):
+        backend.execute(MESSAGE_INSERT, (conversation_id, uuid.uuid4(), 1, f"m{i}", START + timedelta(seconds=offset)))
+    return conversation_id
+
+
+def test_select_returns_rows_in_clustering_order():
+    backend = MemoryBackend()
+    conversation_id = make_conversation(backend, [2, 0, 3, 1])
+    rows = backend.execute("SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,))
+    assert ids(rows) == ["m2", "m0", "m3", "m1"]
+
+
+def test_ties_on_created_at_are_ordered_by_message_id():
+    backend = MemoryBackend()
+    conversation_id = uuid.uuid4()
+    message_ids = sorted(uuid.uuid4() for _ in range(5))
+    for message_id in reversed(message_ids):
+        backend.execute(MESSAGE_INSERT, (conversation_id, message_id, 1, "same", START))
+    rows = backend.execute("SELECT message_id FROM messages WHERE conversation_id = ?", (conversation_id,))
+    assert [row['message_id'] for row in rows] == message_ids
+
+
+def test_order_by_reverses_the_clustering_order():
+    backend = MemoryBackend()
+    conversation_id = make_conversation(backend, [2, 0, 3, 1])
+    rows = backend.execute(
+        "SELECT * FROM messages WHERE conversation_id = ? ORDER BY created_at ASC, message_id DESC",
+        (conversation_id,)
+    )
+    assert ids(rows) == ["m1", "m3", "m0", "m2"]
+
+
+def test_limit_applies_after_ordering():
+    backend = MemoryBackend()
+    conversation_id = make_conversation(backend, range(10))
+    newest = backend.execute("SELECT * FROM messages WHERE conversation_id = ? LIMIT ?", (conversation_id, 3))
+    oldest = backend.execute(
+        "SELECT * FROM messages WHERE conversation_id = ? ORDER BY created_at ASC LIMIT 3", (conversation_id,)
+    )
+    assert ids(newest) == ["m9", "m8", "m7"]
+    assert ids(oldest) == ["m0", "m1", "m2"]
+
+
+@pytest.mark.parametrize("condition, expected", [
+    ("created_at < ?", ["m4", "m3", "m2", "m1", "m0"]),
+    ("created_at <= ?", ["m5", "m4", "m3", "m2", "m1", "m0"]),
+    ("created_at > ?", ["m9", "m8", "m7", "m6"]),
+    ("created_at >= ?", ["m9", "m8", "m7", "m6", "m5"]),
+    ("created_at = ?", ["m5"]),
+])
+def test_range_conditions_on_a_clustering_column(condition, expected):
+    backend = MemoryBackend()
+    conversation_id = make_conversation(backend, range(10))
+    rows = backend.execute(
+        f"SELECT * FROM messages WHERE conversation_id = ? AND {condition}",
+        (conversation_id, START + timedelta(seconds=5))
+    )
+    assert ids(rows) == expected
+
+
+def test_range_on_the_second_clustering_column():
+    backend = MemoryBackend()
+    conversation_id = uuid.uuid4()
+    message_ids = sorted(uuid.uuid4() for _ in range(4))
+    for message_id in message_ids:
+        backend.execute(MESSAGE_INSERT, (conversation_id, message_id, 1, "same", START))
+    rows = backend.execute(
+        "SELECT message_id FROM messages WHERE conversation_id = ? AND created_at = ? AND message_id > ? LIMIT ?",
+        (conversation_id, START, message_ids[1], 10)
+    )
+    assert [row['message_id'] for row in rows] == message_ids[2:]
+
+
+def test_timestamps_are_truncated_to_milliseconds():
+    backend = MemoryBackend()
+    conversation_id = uuid.uuid4()
+    backend.execute(MESSAGE_INSERT, (conversation_id, uuid.uuid4(), 1, "m", START.replace(microsecond=123456)))
+    row, = backend.execute("SELECT created_at FROM messages WHERE conversation_id = ?", (conversation_id,))
+    assert row['created_at'] == START.replace(microsecond=123000)
+
+
+def test_insert_overwrites_an_existing_row():
+    backend = MemoryBackend()
+    conversation_id, message_id = uuid.uuid4(), uuid.uuid4()
+    backend.execute(MESSAGE_INSERT, (conversation_id, message_id, 1, "first", START))
+    backend.execute(MESSAGE_INSERT, (conversation_id, message_id, 1, "second", START))
+    rows = backend.execute("SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,))
+    assert ids(rows) == ["second"]
+
+
+def test_if_not_exists_keeps_the_first_write():
+    backend = MemoryBackend()
+    query = "INSERT INTO conversation_ids (id, conversation_id) VALUES (?, ?) IF NOT EXISTS"
+    first, second = uuid.uuid4(), uuid.uuid4()
+    assert backend.execute(query, (7, first)) == [{"[applied]": True}]
+    row, = backend.execute(query, (7, second))
+    assert row["[applied]"] is False
+    assert row['conversation_id'] == first
+    assert backend.execute("SELECT conversation_id FROM conversation_ids WHERE id = ?", (7,)) == [{'conversation_id': first}]
+
+
+def test_counters_start_at_zero_and_add_up():
+    backend = MemoryBackend()
+    conversation_id = uuid.uuid4()
+    select = "SELECT message_count FROM conversation_message_counts WHERE conversation_id = ?"
+    assert backend.execute(select, (conversation_id,)) == []
+    backend.execute("UPDATE conversation_message_counts SET message_count = message_count + ? WHERE conversation_id = ?",
+                    (3, conversation_id))
+    backend.execute("UPDATE conversation_message_counts SET message_count = message_count + 1 WHERE conversation_id = ?",
+                    (conversation_id,))
+    assert backend.execute(select, (conversation_id,)) == [{'message_count': 4}]
+
+
+def test_delete_a_row_and_a_partition():
+    backend = MemoryBackend()
+    conversation_id = make_conversation(backend, range(3))
+    rows = backend.execute("SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,))
+    backend.execute("DELETE FROM messages WHERE conversation_id = ? AND created_at = ? AND message_id = ?",
+                    (conversation_id, rows[0]['created_at'], rows[0]['message_id']))
+    assert ids(backend.execute("SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,))) == ["m1", "m0"]
+    backend.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+    assert backend.execute("SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,)) == []
+
+
+def test_queries_must_restrict_the_partition_key():
+    backend = MemoryBackend()
+    with pytest.raises(ValueError):
+        backend.execute("SELECT * FROM messages WHERE created_at > ?", (START,))
+
+
+def test_unsupported_queries_are_rejected():
+    backend = MemoryBackend()
+    with pytest.raises(ValueError):
+        backend.execute("SELECT * FROM messages")
+    with pytest.raises(ValueError):
+        backend.execute("SELECT * FROM unknown_table WHERE id = ?", (1,))
+
+
+def test_astream_yields_every_row_in_pages():
+    backend = MemoryBackend()
+    conversation_id = make_conversation(backend, range(7))
+    
+    async def read():
+        return [row async for row in backend.astream(
+            "SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,), fetch_size=3
+        )]
+    
+    assert ids(asyncio.run(read())) == [f"m{i}" for i in reversed(range(7))]
+
+
+def test_batches_apply_every_statement():
+    backend = MemoryBackend()
+    conversation_id = uuid.uuid4()
+    statements = [(MESSAGE_INSERT, (conversation_id, uuid.uuid4(), 1, f"m{i}", START + timedelta(seconds=i)))
+                  for i in range(3)]
+    asyncio.run(backend.aexecute_batch(statements))
+    rows = backend.execute("SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,))
+    assert ids(rows) == ["m2", "m1", "m0"]
@@ -0,0 +1,97 @@
+"""
+Tests of cursor encoding and of paging through conversation history.
+"""
+import asyncio
+import base64
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models import cassandra_models
+from app.models.cassandra_models import MESSAGE_INSERT, MessageModel
+from app.models.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+START = datetime(2024, 1, 1)
+
+
+def test_cursor_round_trip():
+    message_id = uuid.uuid4()
+    created_at = START.replace(microsecond=250000)
+    assert decode_cursor(encode_cursor(created_at, message_id)) == (created_at, message_id)
+
+
+def test_cursor_keeps_milliseconds_only():
+    message_id = uuid.uuid4()
+    created_at, _ = decode_cursor(encode_cursor(START.replace(microsecond=250999), message_id))
+    assert created_at == START.replace(microsecond=250000)
+
+
+def test_cursor_of_an_aware_timestamp_is_in_utc():
+    message_id = uuid.uuid4()
+    aware = datetime(2024, 1, 1, 2, tzinfo=timezone(timedelta(hours=2)))
+    assert decode_cursor(encode_cursor(aware, message_id)) == (START, message_id)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(START, uuid.UUID(int=2 ** 128 - 1))
+    assert "=" not in cursor
+    assert all(c.isalnum() or c in "-_" for c in cursor)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "abc",
+    base64.urlsafe_b64encode(b"too short").decode("ascii"),
+    base64.urlsafe_b64encode(b"x" * 25).decode("ascii"),
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+def insert_messages(conversation_id, created_ats):
+    for i, created_at in enumerate(created_ats):
+        cassandra_models.storage.execute(MESSAGE_INSERT, (conversation_id, uuid.uuid4(), 1, f"m{i}", created_at))
+
+
+def read_all_pages(conversation_id, limit):
+    """Follow next_cursor from the first page to the last; return every row read."""
+    async def read():
+        rows, cursor = await MessageModel._read_message_page(conversation_id, limit)
+        pages = [rows]
+        while cursor is not None:
+            rows, cursor = await MessageModel._read_message_page(conversation_id, limit, cursor=cursor)
+            pages.append(rows)
+        return pages
+    
+    return asyncio.run(read())
+
+
+def test_pages_split_messages_sharing_created_at():
+    conversation_id = uuid.uuid4()
+    # Seven messages in the same millisecond between older and newer ones
+    insert_messages(conversation_id, [START] * 7 + [START - timedelta(seconds=1), START + timedelta(seconds=1)])
+    expected = cassandra_models.storage.execute(
+        "SELECT * FROM messages WHERE conversation_id = ?", (conversation_id,)
+    )
+    pages = read_all_pages(conversation_id, 3)
+    assert [len(page) for page in pages] == [3, 3, 3]
+    assert [row['message_id'] for page in pages for row in page] == [row['message_id'] for row in expected]
+
+
+def test_last_page_has_no_cursor():
+    conversation_id = uuid.uuid4()
+    insert_messages(conversation_id, [START + timedelta(seconds=i) for i in range(4)])
+    pages = read_all_pages(conversation_id, 4)
+    assert [len(page) for page in pages] == [4]
+
+
+def test_cursor_past_the_oldest_message_reads_an_empty_page():
+    conversation_id = uuid.uuid4()
+    insert_messages(conversation_id, [START])
+    cursor = encode_cursor(START - timedelta(days=1), uuid.UUID(int=0))
+    rows, next_cursor = asyncio.run(MessageModel._read_message_page(conversation_id, 10, cursor=cursor))
+    assert rows == []
+    assert next_cursor is None
@@ -0,0 +1,105 @@
+"""
+Tests of the push hub's fan-out, slow consumer policies and shutdown.
+"""
+import asyncio
+
+import pytest
+
+from app.push import MessageHub
+
+
+def test_events_reach_every_subscription_of_the_user():
+    async def run():
+        hub = MessageHub(max_queue=10)
+        first, second = hub.subscribe(1), hub.subscribe(1)
+        other = hub.subscribe(2)
+        assert hub.publish(1, {'n': 1}) == 2
+        return await first.get(1), await second.get(1), other.pending()
+    
+    assert asyncio.run(run()) == ({'n': 1}, {'n': 1}, 0)
+
+
+def test_get_waits_for_a_publish():
+    async def run():
+        hub = MessageHub(max_queue=10)
+        subscription = hub.subscribe(1)
+        waiting = asyncio.ensure_future(subscription.get(1))
+        await asyncio.sleep(0)
+        hub.publish(1, {'n': 1})
+        return await waiting
+    
+    assert asyncio.run(run()) == {'n': 1}
+
+
+def test_get_times_out():
+    async def run():
+        subscription = MessageHub(max_queue=10).subscribe(1)
+        with pytest.raises(asyncio.TimeoutError):
+            await subscription.get(0.01)
+    
+    asyncio.run(run())
+
+
+def test_close_ends_every_subscription():
+    async def run():
+        hub = MessageHub(max_queue=10)
+        waiting = hub.subscribe(1)
+        queued = hub.subscribe(2)
+        hub.publish(2, {'n': 1})
+        reader = asyncio.ensure_future(waiting.get(1))
+        await asyncio.sleep(0)
+        hub.close()
+        return hub, await reader, await queued.get(1), waiting, queued
+    
+    hub, woken, queued_event, waiting, queued = asyncio.run(run())
+    # A reader blocked in get is woken, and queued events are discarded
+    assert woken is None
+    assert queued_event is None
+    assert waiting.closed and queued.closed
+    assert hub.stats()['subscriptions'] == 0
+    assert hub.publish(1, {'n': 2}) == 0
+
+
+def test_drop_oldest_marks_the_subscription_lagged():
+    async def run():
+        hub = MessageHub(max_queue=2, slow_consumer="drop_oldest")
+        subscription = hub.subscribe(1)
+        for n in range(3):
+            hub.publish(1, {'n': n})
+        return hub, subscription, [await subscription.get(1) for _ in range(2)]
+    
+    hub, subscription, events = asyncio.run(run())
+    assert events == [{'n': 1}, {'n': 2}]
+    assert subscription.lagged
+    assert subscription.dropped == 1
+    assert hub.stats()['dropped'] == 1
+
+
+def test_disconnect_closes_a_slow_subscription():
+    async def run():
+        hub = MessageHub(max_queue=2, slow_consumer="disconnect")
+        subscription = hub.subscribe(1)
+        for n in range(3):
+            hub.publish(1, {'n': n})
+        return hub, subscription, await subscription.get(1)
+    
+    hub, subscription, event = asyncio.run(run())
+    assert event is None
+    assert subscription.dropped == 3
+    assert hub.stats()['disconnected'] == 1
+
+
+def test_oldest_subscription_is_closed_past_the_per_user_limit():
+    async def run():
+        hub = MessageHub(max_queue=10, max_subscriptions_per_user=2)
+        subscriptions = [hub.subscribe(1) for _ in range(3)]
+        return hub, subscriptions
+    
+    hub, subscriptions = asyncio.run(run())
+    assert [subscription.closed for subscription in subscriptions] == [True, False, False]
+    assert hub.stats()['subscriptions'] == 2
+
+
+def test_unknown_slow_consumer_policy_is_rejected():
+    with pytest.raises(ValueError):
+        MessageHub(max_queue=10, slow_consumer="block")
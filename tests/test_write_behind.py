@@ -0,0 +1,137 @@
+"""
+Tests of the coalescing write-behind queue.
+"""
+import asyncio
+
+from app.models.write_behind import CoalescingWriteQueue
+
+
+class Recorder:
+    """Flush callback recording each batch, optionally failing or blocking."""
+    
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+        self.release = None
+    
+    async def __call__(self, values):
+        if self.release is not None:
+            await self.release.wait()
+        self.batches.append(list(values))
+        return [RuntimeError("write failed") if value in self.fail else None for value in values]
+
+
+def test_writes_to_one_key_are_coalesced():
+    async def run():
+        recorder = Recorder()
+        queue = CoalescingWriteQueue(recorder, window=60, max_pending=100)
+        await queue.put("a", "a1", 1)
+        await queue.put("a", "a3", 3)
+        await queue.put("a", "a2", 2)
+        await queue.put("b", "b1", 1)
+        await queue.drain()
+        return recorder, queue
+    
+    recorder, queue = asyncio.run(run())
+    assert recorder.batches == [["a3", "b1"]]
+    assert queue.stats()['merged'] == 2
+    assert queue.stats()['written'] == 2
+    assert queue.depth() == 0
+
+
+def test_window_flushes_without_drain():
+    async def run():
+        recorder = Recorder()
+        queue = CoalescingWriteQueue(recorder, window=0.01, max_pending=100)
+        await queue.put("a", "a1", 1)
+        await asyncio.sleep(0.05)
+        return recorder
+    
+    assert asyncio.run(run()).batches == [["a1"]]
+
+
+def test_full_queue_flushes_before_the_window():
+    async def run():
+        recorder = Recorder()
+        queue = CoalescingWriteQueue(recorder, window=60, max_pending=2)
+        await queue.put("a", "a1", 1)
+        await queue.put("b", "b1", 1)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        batches = list(recorder.batches)
+        await queue.drain()
+        return batches
+    
+    assert asyncio.run(run()) == [["a1", "b1"]]
+
+
+def test_failed_writes_are_retried_then_dropped():
+    async def run():
+        recorder = Recorder(fail={"bad"})
+        queue = CoalescingWriteQueue(recorder, window=60, max_pending=100, max_attempts=2)
+        await queue.put("a", "good", 1)
+        await queue.put("b", "bad", 1)
+        await queue.drain()
+        return recorder, queue
+    
+    recorder, queue = asyncio.run(run())
+    assert recorder.batches == [["good", "bad"], ["bad"]]
+    assert queue.stats()['dropped'] == 1
+    assert queue.depth() == 0
+
+
+def test_newer_write_replaces_a_failed_retry():
+    async def run():
+        recorder = Recorder(fail={"a1"})
+        queue = CoalescingWriteQueue(recorder, window=60, max_pending=100)
+        await queue.put("a", "a1", 1)
+        await queue._start_flush()
+        await queue.put("a", "a2", 2)
+        await queue.drain()
+        return recorder
+    
+    assert asyncio.run(run()).batches == [["a1"], ["a2"]]
+
+
+def test_full_queue_makes_writers_of_new_keys_wait():
+    async def run():
+        recorder = Recorder()
+        recorder.release = asyncio.Event()
+        queue = CoalescingWriteQueue(recorder, window=60, max_pending=2)
+        await queue.put("a", "a1", 1)
+        await queue.put("b", "b1", 1)
+        # Let the flush of a and b start; it stays blocked while c and d refill the queue
+        await asyncio.sleep(0)
+        await queue.put("c", "c1", 1)
+        await queue.put("d", "d1", 1)
+        waiting = asyncio.ensure_future(queue.put("e", "e1", 1))
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        # A key already pending merges without waiting
+        await asyncio.wait_for(queue.put("c", "c2", 2), 1)
+        recorder.release.set()
+        await asyncio.wait_for(waiting, 1)
+        await queue.drain()
+        return blocked, recorder
+    
+    blocked, recorder = asyncio.run(run())
+    assert blocked
+    assert recorder.batches == [["a1", "b1"], ["c2", "d1"], ["e1"]]
+
+
+def test_drain_waits_for_a_running_flush():
+    async def run():
+        recorder = Recorder()
+        recorder.release = asyncio.Event()
+        queue = CoalescingWriteQueue(recorder, window=60, max_pending=1)
+        await queue.put("a", "a1", 1)
+        draining = asyncio.ensure_future(queue.drain())
+        await asyncio.sleep(0.01)
+        done_early = draining.done()
+        recorder.release.set()
+        await asyncio.wait_for(draining, 1)
+        return done_early, recorder
+    
+    done_early, recorder = asyncio.run(run())
+    assert not done_early
+    assert recorder.batches == [["a1"]]